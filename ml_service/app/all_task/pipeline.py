@@ -1,16 +1,21 @@
+import asyncio
 import os
 from typing import Optional
 from dotenv import load_dotenv
 import base64
 
-# LangChain Models
-from langchain_community.chat_models import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
+from ..utils.llm_clients import get_chat_model
+from ..utils.metrics import stage, timed_stage
+from ..utils.singleflight import fingerprint, llm_flight
+from .response_cache import prompt_version, response_cache
+from .router import hedged_router
 
 # Load env vars
 load_dotenv()
 
+# "auto" routes each call to the fastest healthy provider and hedges on slow answers.
+DEFAULT_PROVIDER = os.getenv("LLM_PROVIDER") or "gemini"
+
 # Prompt Templates
 TEXT_RECOGNITION_PROMPT = """
 You are a helpful assistant. You will be given an image of a text document. Your task is to extract the text from the image and return it in a structured format.
@@ -80,15 +85,18 @@ Expected output:
 # Unified LLM Handler
 # ---------------------------
 
+LLM_MODELS = {
+    "openai": ("gpt-4o-mini", 0.2),
+    "gemini": ("gemini-2.0-flash-exp", 0.2),
+    "groq": ("llama3-8b-8192", None),
+}
+
+
 def get_llm(provider: str):
-    if provider == "openai":
-        return ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
-    elif provider == "gemini":
-        return ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.2, google_api_key=os.getenv("GOOGLE_API_KEY"))
-    elif provider == "groq":
-        return ChatGroq(model="llama3-8b-8192", groq_api_key=os.getenv("GROQ_API_KEY"))
-    else:
+    if provider not in LLM_MODELS:
         raise ValueError(f"Unsupported provider: {provider}")
+    model, temperature = LLM_MODELS[provider]
+    return get_chat_model(provider, model, temperature)
 
 
 # ---------------------------
@@ -113,6 +121,7 @@ import cv2
 from pyzbar.pyzbar import decode
 import numpy as np
 
+@timed_stage("barcode_decode")
 def extract_barcode_from_base64(base64_image: str):
     image_bytes = base64.b64decode(base64_image)
     image_np = np.frombuffer(image_bytes, dtype=np.uint8)
@@ -128,6 +137,7 @@ def extract_barcode_from_base64(base64_image: str):
 import requests
 import json
 
+@timed_stage("product_lookup")
 def fetch_book_main_info(isbn: str) -> Optional[dict]:
     """
     Fetch and return only the main book information from Google Books API using ISBN.
@@ -167,8 +177,7 @@ def fetch_book_main_info(isbn: str) -> Optional[dict]:
     return result
 
 
-def get_llm_response(query: str, task: str, base64_image: Optional[str] = None, provider: str = "gemini"):
-    llm = get_llm(provider)
+def build_messages(query: str, task: str, base64_image: Optional[str] = None):
     prompt = get_task_prompt(task)
 
     if task == "product_recognition" and base64_image:
@@ -194,10 +203,116 @@ def get_llm_response(query: str, task: str, base64_image: Optional[str] = None,
             {"role": "system", "content": prompt},
             {"role": "user", "content": query}
         ]
+
+    return messages
+
+
+def get_llm_response(query: str, task: str, base64_image: Optional[str] = None, provider: str = "gemini"):
+    version = prompt_version(get_task_prompt(task), query)
+    if base64_image:
+        cached, image_hash = response_cache.lookup(task, version, base64_image)
+        if cached is not None:
+            return cached
+
+    llm = get_llm(provider)
+    messages = build_messages(query, task, base64_image)
     
-    response = llm.invoke(messages)
-    
-    return response.content.strip()
+    with stage("llm"):
+        response = llm.invoke(messages)
+    answer = response.content.strip()
+
+    if base64_image:
+        response_cache.store(task, version, image_hash, answer)
+    return answer
+
+
+# ---------------------------
+# Async Task Handler
+# ---------------------------
+
+# Maximum number of in-flight upstream calls per task. Requests above the limit
+# wait on the event loop instead of piling more load on the provider.
+TASK_CONCURRENCY = {
+    "text_recognition": 16,
+    "general_question_answering": 32,
+    "image_captioning": 16,
+    "product_recognition": 8,
+    "currency_detection": 16,
+    "distance_estimation": 16,
+}
+DEFAULT_TASK_CONCURRENCY = int(os.getenv("LLM_TASK_CONCURRENCY", "16"))
+
+_task_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+def get_task_semaphore(task: str) -> asyncio.Semaphore:
+    semaphore = _task_semaphores.get(task)
+    if semaphore is None:
+        limit = int(os.getenv(f"LLM_CONCURRENCY_{task.upper()}", TASK_CONCURRENCY.get(task, DEFAULT_TASK_CONCURRENCY)))
+        semaphore = _task_semaphores[task] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+async def aget_llm_response(query: str, task: str, base64_image: Optional[str] = None, provider: str = DEFAULT_PROVIDER):
+    """Async counterpart of `get_llm_response` that never blocks the event loop.
+
+    Barcode decoding and the product lookup run in a worker thread, the model
+    call goes through the chat model's native `ainvoke`.
+    """
+    version = prompt_version(get_task_prompt(task), query)
+    image_hash = None
+    if base64_image:
+        with stage("cache_lookup"):
+            cached, image_hash = await asyncio.to_thread(response_cache.lookup, task, version, base64_image)
+        if cached is not None:
+            return cached
+
+    # Identical concurrent requests (retries, several tabs) share one upstream call.
+    key = fingerprint(task, provider, query, base64_image or "")
+    return await llm_flight.do(key, lambda: _ainvoke_llm(query, task, base64_image, provider, version, image_hash))
+
+
+async def _ainvoke_llm(query: str, task: str, base64_image: Optional[str], provider: str, version: str, image_hash: Optional[int]):
+    async with get_task_semaphore(task):
+        messages = await asyncio.to_thread(build_messages, query, task, base64_image)
+
+        with stage("llm"):
+            if provider == "auto":
+                response = await hedged_router.invoke(task, messages, get_llm)
+            else:
+                response = await get_llm(provider).ainvoke(messages)
+
+    answer = response.content.strip()
+    if base64_image:
+        response_cache.store(task, version, image_hash, answer)
+    return answer
+
+async def astream_llm_response(query: str, task: str, base64_image: Optional[str] = None, provider: str = DEFAULT_PROVIDER):
+    """Yield the answer as text chunks as they arrive from the provider."""
+    version = prompt_version(get_task_prompt(task), query)
+    if base64_image:
+        cached, image_hash = await asyncio.to_thread(response_cache.lookup, task, version, base64_image)
+        if cached is not None:
+            yield cached
+            return
+
+    chunks = []
+    async with get_task_semaphore(task):
+        messages = await asyncio.to_thread(build_messages, query, task, base64_image)
+        if provider == "auto":
+            # A stream cannot be hedged once tokens are out; take the current fastest provider.
+            needs_vision = any(isinstance(message["content"], list) for message in messages)
+            provider = hedged_router.candidates(task, needs_vision)[0]
+        llm = get_llm(provider)
+
+        with stage("llm_stream"):
+            async for chunk in llm.astream(messages):
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+
+    if base64_image:
+        response_cache.store(task, version, image_hash, "".join(chunks).strip())
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,175 @@
+import base64
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# ---------------------------
+# Perceptual-hash response cache for image tasks
+# ---------------------------
+
+# Per-task switches. `ttl` is in seconds. Tasks with `max_distance` match any
+# frame whose 64-bit dHash is within that Hamming distance; a 9x8 dHash cannot
+# see small text, so tasks that read text, digits or barcodes (a dosage, a
+# price, a product code) only reuse answers for byte-identical images.
+TASK_CACHE_SETTINGS = {
+    "text_recognition": {"enabled": True, "ttl": 600, "max_distance": None},
+    "product_recognition": {"enabled": True, "ttl": 600, "max_distance": None},
+    "currency_detection": {"enabled": True, "ttl": 120, "max_distance": None},
+    "image_captioning": {"enabled": True, "ttl": 60, "max_distance": 6},
+    # The scene in front of a walking user changes within seconds.
+    "distance_estimation": {"enabled": True, "ttl": 3, "max_distance": 3},
+}
+
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+
+def dhash(base64_image: str) -> Optional[int]:
+    """64-bit difference hash of an image, or None if it cannot be decoded."""
+    image_np = np.frombuffer(base64.b64decode(base64_image), dtype=np.uint8)
+    # Decoding at 1/8 scale is enough for a 9x8 thumbnail and much cheaper.
+    image = cv2.imdecode(image_np, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+
+    thumbnail = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def content_hash(base64_image: str) -> Optional[str]:
+    """sha256 of the decoded image bytes, or None if the payload is not valid base64."""
+    try:
+        return hashlib.sha256(base64.b64decode(base64_image, validate=False)).hexdigest()
+    except ValueError:
+        return None
+
+
+def prompt_version(prompt: str, query: str) -> str:
+    return hashlib.sha1(f"{prompt}\x00{query}".encode("utf-8")).hexdigest()[:12]
+
+
+class _CacheEntry:
+    def __init__(self, task, version, image_hash, answer, ttl):
+        self.task = task
+        self.version = version
+        self.image_hash = image_hash
+        self.answer = answer
+        self.expires_at = time.monotonic() + ttl
+        self.size = len(answer.encode("utf-8"))
+
+
+class PerceptualResponseCache:
+    """LRU + TTL cache of LLM answers keyed by (task, prompt version, image hash).
+
+    For tasks with a `max_distance`, the hash is a dHash and a lookup matches
+    any stored frame of the same task and prompt version within that Hamming
+    distance, so near-identical captures of the same scene reuse one answer.
+    Other tasks are keyed on a sha256 of the image bytes and match exactly.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, _CacheEntry] = OrderedDict()
+        self._bytes = 0
+        self._counters = {}
+
+    def _count(self, task: str, name: str):
+        counters = self._counters.setdefault(task, {"hits": 0, "misses": 0, "evictions": 0, "expired": 0})
+        counters[name] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        return entry
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            self._count(self._remove(key).task, "expired")
+
+    def lookup(self, task: str, version: str, base64_image: str):
+        """Return (answer or None, image hash). Pass the hash back to `store` on a miss."""
+        settings = TASK_CACHE_SETTINGS.get(task)
+        if not CACHE_ENABLED or not settings or not settings["enabled"]:
+            return None, None
+
+        exact = settings["max_distance"] is None
+        image_hash = content_hash(base64_image) if exact else dhash(base64_image)
+        if image_hash is None:
+            return None, None
+
+        with self._lock:
+            self._purge_expired()
+
+            if exact:
+                key = (task, version, image_hash)
+                if key not in self._entries:
+                    self._count(task, "misses")
+                    return None, image_hash
+                self._entries.move_to_end(key)
+                self._count(task, "hits")
+                return self._entries[key].answer, image_hash
+
+            best_key, best_distance = None, settings["max_distance"] + 1
+            for key, entry in self._entries.items():
+                if entry.task != task or entry.version != version:
+                    continue
+                distance = (entry.image_hash ^ image_hash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+
+            if best_key is None:
+                self._count(task, "misses")
+                return None, image_hash
+
+            self._entries.move_to_end(best_key)
+            self._count(task, "hits")
+            return self._entries[best_key].answer, image_hash
+
+    def store(self, task: str, version: str, image_hash, answer: str):
+        settings = TASK_CACHE_SETTINGS.get(task)
+        if image_hash is None or not answer or not settings or not settings["enabled"]:
+            return
+
+        entry = _CacheEntry(task, version, image_hash, answer, settings["ttl"])
+        if entry.size > self.max_bytes:
+            return
+
+        key = (task, version, image_hash)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._count(self._remove(oldest_key).task, "evictions")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "tasks": {task: dict(counters) for task, counters in self._counters.items()},
+            }
+
+
+response_cache = PerceptualResponseCache()
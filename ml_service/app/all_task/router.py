@@ -0,0 +1,179 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+# ---------------------------
+# Latency-aware provider routing with hedged requests
+# ---------------------------
+
+TEXT_PROVIDERS = ("gemini", "openai", "groq")
+# Groq's llama3-8b-8192 does not accept image input.
+VISION_PROVIDERS = ("gemini", "openai")
+
+ROUTING_WINDOW = int(os.getenv("LLM_ROUTING_WINDOW", "200"))
+MIN_SAMPLES = 5
+MAX_ERROR_RATE = float(os.getenv("LLM_ROUTING_MAX_ERROR_RATE", "0.5"))
+
+# Hedge after the primary's p95, clamped to these bounds (seconds).
+DEFAULT_HEDGE_DEADLINE = float(os.getenv("LLM_HEDGE_DEFAULT_SECONDS", "4.0"))
+MIN_HEDGE_DEADLINE = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "0.5"))
+MAX_HEDGE_DEADLINE = float(os.getenv("LLM_HEDGE_MAX_SECONDS", "10.0"))
+
+
+class ProviderStats:
+    """Rolling latency and error window for one (provider, task) pair."""
+
+    def __init__(self, window: int = ROUTING_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+
+    def record(self, latency: float, ok: bool):
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+
+    def record_censored(self, latency: float):
+        """A call cancelled after `latency` seconds: its real latency was at least that.
+
+        Counting the lower bound keeps a provider that keeps losing hedges from
+        holding on to the fast percentiles it had before it degraded.
+        """
+        self.latencies.append(latency)
+
+    def percentile(self, q: float):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    @property
+    def healthy(self) -> bool:
+        return len(self.outcomes) < MIN_SAMPLES or self.error_rate <= MAX_ERROR_RATE
+
+
+class HedgedRouter:
+    """Sends each call to the fastest healthy provider and hedges on tail latency.
+
+    If the primary has not answered by its rolling p95 (or fails), the same call is
+    sent to the next provider; the first successful answer wins and the other
+    in-flight calls are cancelled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[tuple, ProviderStats] = {}
+        self.hedges = 0
+        self.wins: dict[str, int] = {}
+
+    def _get_stats(self, provider: str, task: str) -> ProviderStats:
+        with self._lock:
+            stats = self._stats.get((provider, task))
+            if stats is None:
+                stats = self._stats[(provider, task)] = ProviderStats()
+            return stats
+
+    def record(self, provider: str, task: str, latency: float, ok: bool):
+        stats = self._get_stats(provider, task)
+        with self._lock:
+            stats.record(latency, ok)
+
+    def record_cancelled(self, provider: str, task: str, latency: float):
+        stats = self._get_stats(provider, task)
+        with self._lock:
+            stats.record_censored(latency)
+
+    def candidates(self, task: str, needs_vision: bool) -> list[str]:
+        providers = VISION_PROVIDERS if needs_vision else TEXT_PROVIDERS
+
+        def rank(provider):
+            stats = self._get_stats(provider, task)
+            p50 = stats.percentile(0.5)
+            # Unmeasured providers keep their configured order behind measured ones.
+            return (not stats.healthy, p50 is None, p50 or 0.0)
+
+        return sorted(providers, key=rank)
+
+    def hedge_deadline(self, provider: str, task: str) -> float:
+        stats = self._get_stats(provider, task)
+        if len(stats.latencies) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DEADLINE
+        return min(MAX_HEDGE_DEADLINE, max(MIN_HEDGE_DEADLINE, stats.percentile(0.95)))
+
+    async def _call(self, provider: str, task: str, messages, get_llm: Callable):
+        start = time.perf_counter()
+        try:
+            response = await get_llm(provider).ainvoke(messages)
+        except asyncio.CancelledError:
+            # Lost the hedge (or the request went away) before answering.
+            self.record_cancelled(provider, task, time.perf_counter() - start)
+            raise
+        except Exception:
+            self.record(provider, task, time.perf_counter() - start, False)
+            raise
+        self.record(provider, task, time.perf_counter() - start, True)
+        return provider, response
+
+    async def invoke(self, task: str, messages, get_llm: Callable):
+        needs_vision = any(isinstance(message["content"], list) for message in messages)
+        remaining = self.candidates(task, needs_vision)
+        pending = set()
+        last_error = None
+
+        def launch():
+            provider = remaining.pop(0)
+            pending.add(asyncio.ensure_future(self._call(provider, task, messages, get_llm)))
+            return self.hedge_deadline(provider, task)
+
+        deadline = launch()
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=deadline if remaining else None, return_when=asyncio.FIRST_COMPLETED)
+
+                for task_done in done:
+                    if task_done.exception() is None:
+                        provider, response = task_done.result()
+                        with self._lock:
+                            self.wins[provider] = self.wins.get(provider, 0) + 1
+                        return response
+                    last_error = task_done.exception()
+
+                # Timed out or a call failed: bring in the next provider.
+                if remaining:
+                    if not done:
+                        with self._lock:
+                            self.hedges += 1
+                    deadline = launch()
+        finally:
+            for task_pending in pending:
+                task_pending.cancel()
+
+        raise last_error
+
+    def stats(self) -> dict:
+        with self._lock:
+            providers = [
+                {
+                    "provider": provider,
+                    "task": task,
+                    "samples": len(stats.outcomes),
+                    "p50": stats.percentile(0.5),
+                    "p95": stats.percentile(0.95),
+                    "error_rate": round(stats.error_rate, 3),
+                    "healthy": stats.healthy,
+                }
+                for (provider, task), stats in self._stats.items()
+            ]
+            return {"hedges": self.hedges, "wins": dict(self.wins), "providers": providers}
+
+
+hedged_router = HedgedRouter()
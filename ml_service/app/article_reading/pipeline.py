@@ -1,12 +1,13 @@
+import asyncio
 import os
 import re
 from dotenv import load_dotenv
 from newspaper import Article
 import requests
 import pyttsx3
-from langchain_community.chat_models import ChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
+from ..utils.llm_clients import get_chat_model
+from ..utils.metrics import timed_stage
+from ..utils.singleflight import fingerprint, pipeline_flight
 import datetime
 import json
 
@@ -21,15 +22,18 @@ class ArticleExample:
         self.url = url
 
 # ---- LLM SWITCHER ----
+LLM_MODELS = {
+    "openai": ("gpt-4o-mini", 0.7),
+    "gemini": ("gemini-2.0-flash", 0.7),
+    "groq": ("llama3-8b-8192", None),
+}
+
+
 def get_llm(provider="openai"):
-    if provider == "openai":
-        return ChatOpenAI(model="gpt-4o-mini", temperature=0.7)
-    elif provider == "gemini":
-        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7, google_api_key=os.getenv("GOOGLE_API_KEY"))
-    elif provider == "groq":
-        return ChatGroq(model="llama3-8b-8192", groq_api_key=os.getenv("GROQ_API_KEY"))
-    else:
+    if provider not in LLM_MODELS:
         raise ValueError("Unsupported provider")
+    model, temperature = LLM_MODELS[provider]
+    return get_chat_model(provider, model, temperature)
 
 
 def refine_query(llm, original_query: str):
@@ -54,6 +58,7 @@ Original query: "{original_query}"
 
 
 # ---- SERPAPI SEARCH ----
+@timed_stage("serpapi_search")
 def serpapi_search(query: str, num_results=5):
     params = {
         "q": query,
@@ -79,6 +84,7 @@ def serpapi_search(query: str, num_results=5):
 
 
 # ---- ARTICLE EXTRACTION ----
+@timed_stage("article_extraction")
 def extract_articles(urls):
     articles = []
     headers = {
@@ -101,6 +107,7 @@ def extract_articles(urls):
 
 
 # ---- SUMMARIZATION ----
+@timed_stage("article_summarization")
 def summarize_articles(llm, articles):
     if not articles:
         return "No valid articles to summarize."
@@ -151,6 +158,12 @@ def execute_pipeline(user_query: str, provider="openai"):
     return articles[:max_articles]
 
 
+async def aexecute_pipeline(user_query: str, provider="openai"):
+    """Run `execute_pipeline` in a worker thread; concurrent identical queries share one run."""
+    key = fingerprint(user_query.strip().lower(), provider)
+    return await pipeline_flight.do(key, lambda: asyncio.to_thread(execute_pipeline, user_query, provider))
+
+
 # ---- MAIN ----
 if __name__ == "__main__":
     query = "Comparisons between OpenAI O3 and Gemini 2.0"
@@ -3,9 +3,10 @@ from pathlib import Path
 import numpy as np
 from .yolov8.YOLOv8 import YOLOv8
 from .yolov8.utils import class_names  
+from ..utils.metrics import stage
 
 model_path = './models/yolov8m.onnx'
-yolov8_detector = YOLOv8(model_path, conf_thres=0.2, iou_thres=0.3)
+yolov8_detector = None
 
 image_path = "./app/distance_estimate/dis.jpg"  
 KNOWN_DISTANCE = 24.0 
@@ -13,6 +14,13 @@ KNOWN_WIDTH = 11.0
 
 focalLength = None
 
+def load_detector(reference_image_path=image_path):
+    """Load the YOLOv8 session and calibrate the focal length from the reference image."""
+    global yolov8_detector
+    yolov8_detector = YOLOv8(model_path, conf_thres=0.2, iou_thres=0.3)
+    calculate_focal_length_stream(reference_image_path)
+    return yolov8_detector
+
 def distance_to_camera(knownWidth, focalLength, perWidth):
     return (knownWidth * focalLength) / perWidth
 
@@ -98,7 +106,8 @@ def calculate_distance_from_image(image_data):
         print("Không thể tải ảnh.")
         return None
     
-    boxes, scores, class_ids = yolov8_detector(image)
+    with stage("yolo_inference"):
+        boxes, scores, class_ids = yolov8_detector(image)
     results = []
     rotation_matrix = np.eye(3)  
     translation_vector = np.array([0, 0, 0])  
@@ -136,5 +145,5 @@ def calculate_distance_from_image(image_data):
     return results
 
 if __name__ == "__main__":
-    calculate_focal_length_stream(image_path)
+    load_detector(image_path)
     run_realtime_detection()
@@ -0,0 +1,385 @@
+import os
+import threading
+
+import numpy as np
+
+# ---------------------------
+# Vector search backends for the face index
+# ---------------------------
+#
+# Every backend stores L2-normalized float32 vectors under integer labels and
+# returns (labels, cosine scores), best first. FaceIndex maps labels back to
+# documents, so backends never see MongoDB ids.
+
+FACE_INDEX_BACKEND = os.getenv("FACE_INDEX_BACKEND", "exact")
+IVF_NLIST = int(os.getenv("FACE_IVF_NLIST", "1024"))
+IVF_NPROBE = int(os.getenv("FACE_IVF_NPROBE", "16"))
+HNSW_M = int(os.getenv("FACE_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("FACE_HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("FACE_HNSW_EF_SEARCH", "64"))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+class ExactBackend:
+    """Brute force: one contiguous matrix, one matrix-vector product per search.
+
+    Rows are appended in place (capacity doubles); removals rebuild the
+    arrays, so a search always sees a consistent snapshot without holding the
+    lock during the product.
+    """
+
+    name = "exact"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._labels = np.zeros(0, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if self._matrix is None else self._matrix.nbytes
+
+    def build(self, labels, vectors):
+        with self._lock:
+            self._matrix = np.ascontiguousarray(vectors, dtype=np.float32) if len(labels) else None
+            self._labels = np.asarray(labels, dtype=np.int64)
+            self._size = len(labels)
+
+    def add(self, labels, vectors):
+        vectors = np.atleast_2d(vectors)
+        with self._lock:
+            needed = self._size + len(vectors)
+            if self._matrix is None or needed > len(self._matrix) or not self._matrix.flags.writeable:
+                capacity = max(16, needed, 2 * self._size)
+                grown = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+                labels_grown = np.empty(capacity, dtype=np.int64)
+                if self._size:
+                    grown[:self._size] = self._matrix[:self._size]
+                    labels_grown[:self._size] = self._labels[:self._size]
+                self._matrix, self._labels = grown, labels_grown
+            self._matrix[self._size:needed] = vectors
+            self._labels[self._size:needed] = labels
+            self._size = needed
+
+    def remove(self, labels):
+        with self._lock:
+            keep = ~np.isin(self._labels[:self._size], labels)
+            if keep.all():
+                return
+            self._matrix = np.ascontiguousarray(self._matrix[:self._size][keep])
+            self._labels = self._labels[:self._size][keep]
+            self._size = len(self._labels)
+
+    def search(self, query, k: int):
+        with self._lock:
+            matrix, labels, size = self._matrix, self._labels, self._size
+        if not size:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = matrix[:size] @ query
+        top = top_k(scores, k)
+        return labels[top], scores[top]
+
+    def save(self, directory):
+        with self._lock:
+            np.save(os.path.join(directory, "vectors.npy"), self._matrix[:self._size] if self._size else np.zeros((0, 0), np.float32))
+            np.save(os.path.join(directory, "labels.npy"), self._labels[:self._size])
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True):
+        backend = cls()
+        mode = "r" if mmap else None
+        vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode=mode)
+        labels = np.load(os.path.join(directory, "labels.npy"))
+        # A memory-mapped matrix is read-only; the first insert copies it into RAM.
+        backend._matrix = vectors if len(labels) else None
+        backend._labels = labels
+        backend._size = len(labels)
+        return backend
+
+
+class IVFBackend:
+    """Inverted-file index (IVF-Flat) in NumPy.
+
+    Vectors are clustered with spherical k-means into `nlist` lists, stored
+    contiguously grouped by list. A search scores the centroids, then only the
+    `nprobe` closest lists: recall rises and speed falls with `nprobe`.
+    Inserts go to a small exact buffer that is folded into the lists once it
+    reaches `merge_fraction` of the indexed size; deletes are tombstones.
+    """
+
+    name = "ivf"
+
+    def __init__(self, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, train_iterations: int = 10,
+                 merge_fraction: float = 0.1, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.merge_fraction = merge_fraction
+        self.seed = seed
+        self._lock = threading.Lock()
+        self.centroids = None   # (lists, dim)
+        self.vectors = None     # (n, dim), grouped by list
+        self.labels = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)  # list i is vectors[offsets[i]:offsets[i + 1]]
+        self.alive = np.zeros(0, dtype=bool)
+        self._positions: dict = {}  # label -> position in vectors
+        self.buffer = ExactBackend()
+
+    def __len__(self):
+        return int(self.alive.sum()) + len(self.buffer)
+
+    @property
+    def nbytes(self) -> int:
+        indexed = 0 if self.vectors is None else self.vectors.nbytes + self.centroids.nbytes
+        return indexed + self.buffer.nbytes
+
+    def _train(self, vectors: np.ndarray) -> np.ndarray:
+        """Spherical k-means on a sample of at most 64 points per list."""
+        rng = np.random.default_rng(self.seed)
+        lists = max(1, min(self.nlist, len(vectors) // 39))
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assignment = self._assign(sample, centroids)
+            order = np.argsort(assignment, kind="stable")
+            counts = np.bincount(assignment, minlength=lists)
+            sums = np.zeros_like(centroids)
+            used = counts > 0
+            sums[used] = np.add.reduceat(sample[order], np.concatenate(([0], np.cumsum(counts)[:-1]))[used])
+            empty = ~used
+            # Re-seed empty lists from random points so no list stays unused.
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.clip(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12, None)
+        return centroids.astype(np.float32)
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        return np.concatenate([
+            (vectors[i:i + chunk] @ centroids.T).argmax(axis=1) for i in range(0, len(vectors), chunk)
+        ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+    def _layout(self, labels, vectors, centroids):
+        assignment = self._assign(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=len(centroids))
+        self.centroids = centroids
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.labels = np.asarray(labels, dtype=np.int64)[order]
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.alive = np.ones(len(self.labels), dtype=bool)
+        self._positions = {int(label): i for i, label in enumerate(self.labels)}
+
+    def build(self, labels, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self.buffer = ExactBackend()
+            if len(vectors) < 39:
+                # Too few faces to cluster; everything stays in the exact buffer.
+                self.centroids, self.vectors = None, None
+                self.labels, self.offsets, self.alive, self._positions = np.zeros(0, np.int64), np.zeros(1, np.int64), np.zeros(0, bool), {}
+                self.buffer.build(labels, vectors)
+                return
+            self._layout(labels, vectors, self._train(vectors))
+
+    def _merge_locked(self):
+        """Fold the buffer and drop tombstones, keeping the trained centroids."""
+        if self.vectors is None and not len(self.buffer):
+            return
+        parts = [(self.labels[self.alive], self.vectors[self.alive])] if self.vectors is not None else []
+        if len(self.buffer):
+            parts.append((self.buffer._labels[:len(self.buffer)], self.buffer._matrix[:len(self.buffer)]))
+        labels = np.concatenate([part[0] for part in parts])
+        vectors = np.concatenate([part[1] for part in parts])
+        self.buffer = ExactBackend()
+        if self.centroids is None:
+            if len(vectors) >= 39:
+                self._layout(labels, vectors, self._train(vectors))
+            else:
+                self.buffer.build(labels, vectors)
+            return
+        self._layout(labels, vectors, self.centroids)
+
+    def add(self, labels, vectors):
+        with self._lock:
+            self.buffer.add(labels, vectors)
+            if len(self.buffer) > max(1000, self.merge_fraction * len(self.labels)):
+                self._merge_locked()
+
+    def remove(self, labels):
+        with self._lock:
+            for label in np.atleast_1d(labels):
+                position = self._positions.pop(int(label), None)
+                if position is not None:
+                    if not self.alive.flags.writeable:
+                        self.alive = self.alive.copy()
+                    self.alive[position] = False
+            self.buffer.remove(labels)
+
+    def search(self, query, k: int):
+        with self._lock:
+            centroids, vectors, labels, offsets, alive = self.centroids, self.vectors, self.labels, self.offsets, self.alive
+            buffer = self.buffer
+        candidate_labels, candidate_scores = [], []
+
+        if centroids is not None:
+            probes = top_k(centroids @ query, self.nprobe)
+            for probe in probes:
+                start, end = offsets[probe], offsets[probe + 1]
+                if start == end:
+                    continue
+                scores = vectors[start:end] @ query
+                mask = alive[start:end]
+                candidate_labels.append(labels[start:end][mask])
+                candidate_scores.append(scores[mask])
+
+        buffered_labels, buffered_scores = buffer.search(query, k)
+        candidate_labels.append(buffered_labels)
+        candidate_scores.append(buffered_scores)
+
+        all_labels = np.concatenate(candidate_labels)
+        all_scores = np.concatenate(candidate_scores)
+        top = top_k(all_scores, k)
+        return all_labels[top], all_scores[top]
+
+    def save(self, directory):
+        with self._lock:
+            self._merge_locked()
+            if self.centroids is None:
+                self.buffer.save(directory)
+                return
+            for name in ("centroids", "vectors", "labels", "offsets", "alive"):
+                np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True):
+        backend = cls()
+        if not os.path.exists(os.path.join(directory, "centroids.npy")):
+            backend.buffer = ExactBackend.load(directory, mmap)
+            return backend
+        mode = "r" if mmap else None
+        backend.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        backend.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode=mode)
+        backend.labels = np.load(os.path.join(directory, "labels.npy"))
+        backend.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        backend.alive = np.load(os.path.join(directory, "alive.npy"))
+        backend._positions = {int(label): i for i, label in enumerate(backend.labels) if backend.alive[i]}
+        return backend
+
+
+class HNSWBackend:
+    """Graph index via the optional `hnswlib` package.
+
+    `M` and `ef_construction` trade build time and memory for recall;
+    `ef_search` trades query speed for recall. hnswlib reads its file fully
+    into memory, so persistence is supported but not memory-mapped.
+    """
+
+    name = "hnsw"
+
+    def __init__(self, M: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION, ef_search: int = HNSW_EF_SEARCH):
+        import hnswlib  # optional dependency
+        self._hnswlib = hnswlib
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._lock = threading.Lock()
+        self._index = None
+        self._live: set = set()
+
+    def __len__(self):
+        return len(self._live)
+
+    @property
+    def nbytes(self) -> int:
+        if self._index is None:
+            return 0
+        # Vectors plus roughly 2*M neighbour links per element at the base layer.
+        return self._index.get_max_elements() * (4 * self._index.dim + 8 * self.M)
+
+    def _new_index(self, dim, capacity):
+        index = self._hnswlib.Index(space="ip", dim=dim)
+        index.init_index(max_elements=capacity, M=self.M, ef_construction=self.ef_construction, allow_replace_deleted=True)
+        index.set_ef(self.ef_search)
+        return index
+
+    def build(self, labels, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._index = None
+            self._live = set(int(label) for label in labels)
+            if len(labels):
+                self._index = self._new_index(vectors.shape[1], max(1024, int(len(labels) * 1.25)))
+                self._index.add_items(vectors, np.asarray(labels))
+
+    def add(self, labels, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            if self._index is None:
+                self._index = self._new_index(vectors.shape[1], 1024)
+            needed = self._index.get_current_count() + len(vectors)
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+            self._index.add_items(vectors, np.asarray(labels), replace_deleted=True)
+            self._live.update(int(label) for label in np.atleast_1d(labels))
+
+    def remove(self, labels):
+        with self._lock:
+            for label in np.atleast_1d(labels):
+                if int(label) in self._live:
+                    self._index.mark_deleted(int(label))
+                    self._live.discard(int(label))
+
+    def search(self, query, k: int):
+        with self._lock:
+            k = min(k, len(self._live))
+            if k <= 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+            labels, distances = self._index.knn_query(query, k=k)
+        # Inner-product distance is 1 - cosine for normalized vectors.
+        return labels[0].astype(np.int64), 1 - distances[0]
+
+    def save(self, directory):
+        with self._lock:
+            if self._index is not None:
+                self._index.save_index(os.path.join(directory, "hnsw.bin"))
+                np.save(os.path.join(directory, "hnsw_dim.npy"), np.int64(self._index.dim))
+            np.save(os.path.join(directory, "hnsw_labels.npy"), np.fromiter(self._live, dtype=np.int64, count=len(self._live)))
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True):
+        backend = cls()
+        backend._live = set(np.load(os.path.join(directory, "hnsw_labels.npy")).tolist())
+        path = os.path.join(directory, "hnsw.bin")
+        if os.path.exists(path):
+            # load_index keeps the constructor's space and dim, so the saved dim must be passed back.
+            # Snapshots written without it raise here and are rebuilt.
+            dim = int(np.load(os.path.join(directory, "hnsw_dim.npy")))
+            backend._index = backend._hnswlib.Index(space="ip", dim=dim)
+            backend._index.load_index(path, allow_replace_deleted=True)
+            backend._index.set_ef(backend.ef_search)
+        return backend
+
+
+ANN_BACKENDS = {
+    "exact": ExactBackend,
+    "ivf": IVFBackend,
+    "hnsw": HNSWBackend,
+}
+
+
+def make_backend(name: str = FACE_INDEX_BACKEND):
+    if name not in ANN_BACKENDS:
+        raise ValueError(f"Unknown face index backend {name!r}, expected one of {sorted(ANN_BACKENDS)}")
+    return ANN_BACKENDS[name]()
@@ -1,12 +1,15 @@
+import importlib
 import numpy as np
 import cv2
-from deepface import DeepFace
 from pymongo import MongoClient
 from dotenv import load_dotenv
-from sklearn.metrics.pairwise import cosine_similarity
 import os
 import sys
+import io
 import json
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(root_dir)
@@ -14,9 +17,22 @@ distance_path = os.path.join(root_dir, "distance_estimate")
 
 from distance_estimate.yolov8.YOLOv8 import YOLOv8
 
+try:
+    from ..utils.metrics import stage
+    from .embedding_codec import encode_embedding
+    from .face_index import FACE_INDEX_PATH, MATCH_THRESHOLD, face_index, utcnow
+    from .tracker import FaceTracker
+except ImportError:  # run as a script
+    from utils.metrics import stage
+    from face_detection.embedding_codec import encode_embedding
+    from face_detection.face_index import FACE_INDEX_PATH, MATCH_THRESHOLD, face_index, utcnow
+    from face_detection.tracker import FaceTracker
+
 image_path = os.path.join(distance_path, "dis.jpg")
 model_path = os.path.join(distance_path, "models", "yolov8m.onnx")
-yolov8_detector = YOLOv8(model_path, conf_thres=0.2, iou_thres=0.3) 
+yolov8_detector = None
+# Imported on first use: DeepFace pulls in TensorFlow, which takes seconds.
+DeepFace = None
 
 load_dotenv()
 
@@ -24,10 +40,38 @@ MONGODB_URI = os.getenv("MONGODB_URI")
 DB_NAME = os.getenv("DB_NAME")
 DB_COLLECTION = os.getenv("DB_COLLECTION")
 
+FACE_DETECTOR_BACKEND = os.getenv("FACE_DETECTOR_BACKEND", "opencv")
+# Registration details returned with a match; the embedding itself is not needed.
+FACE_DETAILS_PROJECTION = {"_id": 0, "hometown": 1, "relationship": 1, "date_of_birth": 1}
+
+# Optional attributes a recognition request can ask for, with their DeepFace model and result key.
+FACE_ATTRIBUTES = {
+    "age": ("Age", "age"),
+    "gender": ("Gender", "dominant_gender"),
+    "emotion": ("Emotion", "dominant_emotion"),
+    "race": ("Race", "dominant_race"),
+}
+_attribute_pool = ThreadPoolExecutor(max_workers=len(FACE_ATTRIBUTES), thread_name_prefix="face-attributes")
+_attribute_locks = {attribute: threading.Lock() for attribute in FACE_ATTRIBUTES}
+_loaded_attributes = set()
+
 KNOWN_DISTANCE = 24.0  
 KNOWN_WIDTH = 11.0    
 focalLength = None
 
+def load_detector(reference_image_path=image_path):
+    """Load the YOLOv8 session and calibrate the focal length from the reference image."""
+    global yolov8_detector
+    yolov8_detector = YOLOv8(model_path, conf_thres=0.2, iou_thres=0.3)
+    calculate_focal_length(reference_image_path)
+    return yolov8_detector
+
+def load_deepface():
+    """Import DeepFace (and TensorFlow) and return the DeepFace module."""
+    global DeepFace
+    DeepFace = importlib.import_module("deepface.DeepFace")
+    return DeepFace
+
 def connect_mongodb():
     """Connect to the MongoDB database."""
     try:
@@ -39,38 +83,184 @@ def connect_mongodb():
         print(f"Error connecting to MongoDB: {e}")
         return None
 
+def load_face_index(collection):
+    """Load the face index and keep it in sync with the collection.
+
+    With FACE_INDEX_PATH set, a saved snapshot is memory-mapped and only the
+    changes since it was written are fetched; otherwise (or if there is no
+    usable snapshot) the index is built from the collection and saved.
+    """
+    if FACE_INDEX_PATH and face_index.load_snapshot(FACE_INDEX_PATH):
+        with stage("face_db_fetch"):
+            face_index.poll(collection)
+    else:
+        with stage("face_db_fetch"):
+            face_index.load(collection)
+        if FACE_INDEX_PATH:
+            save_face_index()
+    face_index.start_sync(collection)
+    return face_index
+
+def save_face_index():
+    """Snapshot the face index to FACE_INDEX_PATH, if set."""
+    if not (FACE_INDEX_PATH and face_index.loaded):
+        return
+    try:
+        face_index.save(FACE_INDEX_PATH)
+    except OSError as e:
+        print(f"Error saving the face index: {e}")
+
 def save_embedding_to_db(collection, name, embedding, hometown, relationship, date_of_birth):
     """Save embedding with additional details to MongoDB."""
     try:
-        collection.insert_one({
+        result = collection.insert_one({
             "name": name,
-            "embedding": embedding.tolist(),
+            **encode_embedding(embedding),
             "hometown": hometown,
             "relationship": relationship,
-            "date_of_birth": date_of_birth
+            "date_of_birth": date_of_birth,
+            "updated_at": utcnow()
         })
+        # Searchable right away in this process; other workers pick it up through their sync.
+        face_index.add(result.inserted_id, name, embedding)
         print(f"Saved {name} to the database with additional details.")
     except Exception as e:
         print(f"Error saving to MongoDB: {e}")
 
 
+# ---------------------------
+# Bulk registration
+# ---------------------------
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+FACE_BULK_MAX_IMAGES = int(os.getenv("FACE_BULK_MAX_IMAGES", "100"))
+FACE_BULK_MAX_IMAGE_BYTES = 20 * 2**20
+FACE_EMBED_BATCH = int(os.getenv("FACE_EMBED_BATCH", "16"))
+# Quality gates for registration shots.
+FACE_MIN_SIZE = int(os.getenv("FACE_MIN_SIZE", "64"))               # pixels, shorter side of the face box
+FACE_MIN_SHARPNESS = float(os.getenv("FACE_MIN_SHARPNESS", "30"))   # variance of the Laplacian at 128x128
+
+def expand_uploads(uploads):
+    """Turn (filename, bytes) uploads into image entries, unpacking zip archives."""
+    images = []
+    for filename, data in uploads:
+        if zipfile.is_zipfile(io.BytesIO(data)):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or info.filename.startswith("__MACOSX/") or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    if info.file_size > FACE_BULK_MAX_IMAGE_BYTES:
+                        raise ValueError(f"{info.filename} is larger than {FACE_BULK_MAX_IMAGE_BYTES // 2**20} MiB")
+                    images.append((f"{filename}/{info.filename}", archive.read(info)))
+                    if len(images) > FACE_BULK_MAX_IMAGES:
+                        break
+        else:
+            images.append((filename, data))
+        if len(images) > FACE_BULK_MAX_IMAGES:
+            raise ValueError(f"At most {FACE_BULK_MAX_IMAGES} images can be registered at once")
+    return images
+
+def check_face_quality(image, faces):
+    """Why a registration shot should be rejected, or None if it is usable."""
+    if len(faces) > 1:
+        return f"{len(faces)} faces in the image"
+    face = faces[0]
+    area = face["facial_area"]
+    if is_whole_image(face, image):
+        return "no face detected"
+    if min(area["w"], area["h"]) < FACE_MIN_SIZE:
+        return f"face is {area['w']}x{area['h']} px, below {FACE_MIN_SIZE} px"
+    region = image[max(area["y"], 0):area["y"] + area["h"], max(area["x"], 0):area["x"] + area["w"]]
+    gray = cv2.cvtColor(cv2.resize(region, (128, 128)), cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    if sharpness < FACE_MIN_SHARPNESS:
+        return f"image is blurry (sharpness {sharpness:.0f} < {FACE_MIN_SHARPNESS:.0f})"
+    return None
+
+def embed_faces(crops):
+    """Embed aligned crops, FACE_EMBED_BATCH at a time.
+
+    DeepFace 0.0.94+ accepts a list of images in one `represent` call; older
+    versions only take one image, so those fall back to a call per crop.
+    """
+    embeddings = []
+    for i in range(0, len(crops), FACE_EMBED_BATCH):
+        batch = crops[i:i + FACE_EMBED_BATCH]
+        with stage("deepface_represent_batch"):
+            try:
+                results = DeepFace.represent(batch, detector_backend="skip", enforce_detection=False)
+                if len(results) != len(batch) or not all(isinstance(result, list) for result in results):
+                    raise TypeError("represent does not support batches")
+                embeddings.extend(result[0]["embedding"] for result in results)
+            except (TypeError, ValueError, AttributeError):
+                embeddings.extend(DeepFace.represent(crop, detector_backend="skip", enforce_detection=False)[0]["embedding"]
+                                  for crop in batch)
+    return np.asarray(embeddings, dtype=np.float32)
+
+def register_faces(collection, name, images, details):
+    """Register one person from several shots.
+
+    Each image is decoded, detected once and checked (one sharp face, large
+    enough); the accepted crops are embedded in batches. Shots that disagree
+    with the rest (cosine similarity to the mean below MATCH_THRESHOLD) are
+    dropped as probably someone else. The person is stored as one document
+    whose `embedding` is the normalized mean template, with the individual
+    embeddings under `samples`, and the face index is updated once.
+    """
+    accepted, crops, rejected = [], [], []
+    for filename, data in images:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            rejected.append({"file": filename, "reason": "not an image"})
+            continue
+        with stage("face_detect"):
+            faces = detect_faces(image)
+        reason = check_face_quality(image, faces)
+        if reason:
+            rejected.append({"file": filename, "reason": reason})
+            continue
+        accepted.append(filename)
+        crops.append(to_skip_input(faces[0]["face"]))
+
+    if not crops:
+        return {"name": name, "accepted": [], "rejected": rejected}
+
+    embeddings = embed_faces(crops)
+    unit = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+    if len(unit) >= 3:
+        mean = unit.mean(axis=0)
+        similarity = unit @ (mean / np.linalg.norm(mean))
+        consistent = similarity >= MATCH_THRESHOLD
+        if consistent.any():
+            rejected.extend({"file": filename, "reason": f"looks like someone else (similarity {sim:.2f})"}
+                            for filename, sim, keep in zip(accepted, similarity, consistent) if not keep)
+            accepted = [filename for filename, keep in zip(accepted, consistent) if keep]
+            embeddings, unit = embeddings[consistent], unit[consistent]
+
+    template = unit.mean(axis=0)
+    template /= np.linalg.norm(template)
+    result = collection.insert_one({
+        "name": name,
+        **encode_embedding(template),
+        **details,
+        "samples": [encode_embedding(embedding) for embedding in embeddings],
+        "sample_count": len(embeddings),
+        "updated_at": utcnow(),
+    })
+    face_index.add_many([result.inserted_id], [name], [template])
+    print(f"Registered {name} from {len(accepted)} of {len(images)} images.")
+    return {"name": name, "face_id": str(result.inserted_id), "accepted": accepted, "rejected": rejected}
+
+
 def find_existing_face(collection, embedding):
     """Find existing faces in the database and return the one with the highest similarity."""
-    threshold = 0.5
-    matched_faces = []
+    if not face_index.loaded:
+        load_face_index(collection)
 
-    existing_faces = collection.find({})
-    
-    for doc in existing_faces:
-        existing_embedding = np.array(doc['embedding'])
-        sim = cosine_similarity([embedding], [existing_embedding])[0][0]
-        print(f"Similarity with {doc['name']}: {sim}")
-        if sim >= threshold:
-            matched_faces.append((doc['name'], sim)) 
-    
-    if matched_faces:
-        highest_similarity_face = max(matched_faces, key=lambda x: x[1])  
-        return highest_similarity_face  
+    match = face_index.best(embedding, MATCH_THRESHOLD)
+    if match:
+        print(f"Best match {match.name} with similarity {match.similarity}")
+        return match.name, np.float64(match.similarity)
     return None  
 
 def distance_to_camera(knownWidth, focalLength, perWidth):
@@ -96,14 +286,35 @@ def calculate_focal_length(reference_image_path):
     else:
         print("Không phát hiện được đối tượng trong ảnh tham chiếu.")
 
-def detect_and_analyze_face():
-    """Detect and analyze a face from the live video feed."""
+def detect_and_analyze_face(continuous=False):
+    """Detect and analyze a face from the live video feed.
+
+    With `continuous`, follow faces frame by frame with a FaceStream and
+    announce each person once, until the feed ends or Ctrl+C.
+    """
     collection = connect_mongodb()  
     if collection is None:
         print("Unable to connect to MongoDB. Exiting the program.")
         return
     cap = cv2.VideoCapture(0)
 
+    if continuous:
+        stream = FaceStream(collection)
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                _, announcements = stream.process(frame)
+                for announcement in announcements:
+                    print(f"Recognized {announcement['name']} ({announcement['relationship']}, {announcement['hometown']})")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            cap.release()
+            print(stream.stats())
+        return
+
     if focalLength is None:
         print("Focal length not calculated. Please provide a reference image.")
         return
@@ -118,49 +329,189 @@ def detect_and_analyze_face():
     cap.release()
     cv2.destroyAllWindows()  
 
+def to_skip_input(face):
+    """extract_faces gives RGB in [0, 1]; the "skip" detector expects an image as loaded by OpenCV."""
+    return np.ascontiguousarray((np.clip(face, 0, 1)[:, :, ::-1] * 255).astype(np.uint8))
+
+def detect_faces(frame):
+    """All faces DeepFace finds in the frame, aligned, largest first."""
+    faces = DeepFace.extract_faces(frame, detector_backend=FACE_DETECTOR_BACKEND, enforce_detection=False, align=True)
+    return sorted(faces, key=lambda f: f["facial_area"]["w"] * f["facial_area"]["h"], reverse=True)
+
+def is_whole_image(face, frame):
+    """Without enforce_detection, DeepFace returns the whole frame when it finds no face."""
+    area = face["facial_area"]
+    return area["x"] <= 0 and area["y"] <= 0 and area["w"] >= frame.shape[1] and area["h"] >= frame.shape[0]
+
+def detect_face(frame):
+    """Detect and align the most prominent face; returns (BGR uint8 crop, facial area).
+
+    Like the rest of the pipeline this does not enforce detection: without a
+    detected face DeepFace returns the whole frame.
+    """
+    face = detect_faces(frame)[0]
+    return to_skip_input(face["face"]), face["facial_area"]
+
+def parse_attributes(value):
+    """Parse a comma-separated attribute list ("age,emotion", "all" or empty) into a tuple."""
+    if not value:
+        return ()
+    if value.strip().lower() == "all":
+        return tuple(FACE_ATTRIBUTES)
+    attributes = tuple(dict.fromkeys(part.strip().lower() for part in value.split(",") if part.strip()))
+    unknown = [attribute for attribute in attributes if attribute not in FACE_ATTRIBUTES]
+    if unknown:
+        raise ValueError(f"Unknown face attributes {unknown}, expected some of {sorted(FACE_ATTRIBUTES)}")
+    return attributes
+
+def load_attribute_model(attribute):
+    """Build one attribute classifier the first time it is asked for."""
+    if attribute in _loaded_attributes:
+        return
+    with _attribute_locks[attribute]:
+        if attribute not in _loaded_attributes:
+            model_name = FACE_ATTRIBUTES[attribute][0]
+            with stage(f"load_{attribute}_model"):
+                try:
+                    DeepFace.build_model(model_name, task="facial_attribute")
+                except TypeError:  # DeepFace before 0.0.90 has no task argument
+                    DeepFace.build_model(model_name)
+            _loaded_attributes.add(attribute)
+
+def analyze_attribute(crop, attribute):
+    """Run one attribute classifier on an aligned face crop."""
+    load_attribute_model(attribute)
+    with stage(f"deepface_{attribute}"):
+        analysis = DeepFace.analyze(crop, actions=[attribute], detector_backend="skip", enforce_detection=False)[0]
+    value = analysis[FACE_ATTRIBUTES[attribute][1]]
+    return int(value) if attribute == "age" else value
+
+def recognize_face(frame, collection, attributes=()):
+    """Recognize the face in a frame in a single pass.
+
+    The face is detected once, and the aligned crop is embedded once and
+    matched once against the face index; the match's details are fetched by
+    `_id`. The requested `attributes` (see FACE_ATTRIBUTES) are classified on
+    the same crop, concurrently with the embedding. Returns None if nobody in
+    the gallery matches.
+    """
+    with stage("face_detect"):
+        crop, facial_area = detect_face(frame)
+    pending = {attribute: _attribute_pool.submit(analyze_attribute, crop, attribute) for attribute in attributes}
+    try:
+        with stage("deepface_represent"):
+            embedding = DeepFace.represent(crop, detector_backend="skip", enforce_detection=False)[0]["embedding"]
+
+        with stage("face_match"):
+            if not face_index.loaded:
+                load_face_index(collection)
+            match = face_index.best(embedding, MATCH_THRESHOLD)
+    except Exception:
+        for future in pending.values():
+            future.cancel()
+        raise
+    if match is None:
+        for future in pending.values():
+            future.cancel()
+        return None
+
+    with stage("yolo_inference"):
+        boxes, _, _ = yolov8_detector(frame)
+    distance = None
+    if boxes is not None and len(boxes) > 0:
+        distance = float(distance_to_camera(KNOWN_WIDTH, focalLength, boxes[0][2] - boxes[0][0]))
+
+    with stage("face_metadata"):
+        details = collection.find_one({"_id": match.id}, FACE_DETAILS_PROJECTION) or {}
+
+    return {
+        "name": match.name,
+        "face_id": str(match.id),
+        "similarity_score": match.similarity,
+        "facial_area": {key: int(value) for key, value in facial_area.items() if key in ("x", "y", "w", "h")},
+        **{attribute: future.result() for attribute, future in pending.items()},
+        "distance": distance,
+        "hometown": details.get("hometown", "Unknown"),
+        "relationship": details.get("relationship", "Unknown"),
+        "date_of_birth": details.get("date_of_birth", "Unknown"),
+    }
+
+class FaceStream:
+    """Continuous recognition over video frames from one camera.
+
+    Faces are detected on every frame and followed with a FaceTracker; only
+    tracks that are new or whose confidence has decayed are embedded (in one
+    batch) and matched. Each identity is announced once per stream, with its
+    registration details.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.tracker = FaceTracker()
+        self.announced = set()
+        self.frames = 0
+        self.embedded = 0
+
+    def process(self, frame):
+        """Returns (tracks as dicts, announcements for identities seen for the first time)."""
+        self.frames += 1
+        with stage("face_detect"):
+            faces = [face for face in detect_faces(frame) if not is_whole_image(face, frame)]
+        boxes = [tuple(face["facial_area"][key] for key in ("x", "y", "w", "h")) for face in faces]
+        tracks = self.tracker.update(boxes)
+
+        pending = [(track, face) for track, face in zip(tracks, faces) if track.needs_identification]
+        if pending:
+            embeddings = embed_faces([to_skip_input(face["face"]) for _, face in pending])
+            self.embedded += len(pending)
+            with stage("face_match"):
+                if not face_index.loaded:
+                    load_face_index(self.collection)
+                for (track, _), embedding in zip(pending, embeddings):
+                    track.identified(face_index.best(embedding, MATCH_THRESHOLD))
+
+        announcements = []
+        for track in tracks:
+            if track.match is not None and track.match.id not in self.announced:
+                self.announced.add(track.match.id)
+                with stage("face_metadata"):
+                    details = self.collection.find_one({"_id": track.match.id}, FACE_DETAILS_PROJECTION) or {}
+                announcements.append({
+                    "track_id": track.id,
+                    "name": track.match.name,
+                    "face_id": str(track.match.id),
+                    "similarity_score": track.match.similarity,
+                    "hometown": details.get("hometown", "Unknown"),
+                    "relationship": details.get("relationship", "Unknown"),
+                    "date_of_birth": details.get("date_of_birth", "Unknown"),
+                })
+        return [track.to_dict() for track in tracks], announcements
+
+    def stats(self) -> dict:
+        return {"frames": self.frames, "embedded_faces": self.embedded, "identities": len(self.announced)}
+
 def process_frame(frame, collection):
     """Analyze the frame and find or save embeddings."""
     response_data = []
     try:
-        representations = DeepFace.represent(frame, enforce_detection=False)
-        if isinstance(representations, list) and len(representations) > 0:
-            embedding = representations[0]['embedding']
-
-        analysis = DeepFace.analyze(frame, actions=['age', 'gender', 'emotion', 'race'], enforce_detection=False)
-        if analysis and isinstance(analysis, list):
-            analysis_result = analysis[0]  
-            
-            age = analysis_result['age']
-            dominant_gender = analysis_result['dominant_gender']
-            dominant_emotion = analysis_result['dominant_emotion']
-            dominant_race = analysis_result['dominant_race']
-
-            highest_similarity_face = find_existing_face(collection, np.array(embedding))
-            if highest_similarity_face:
-                name, similarity = highest_similarity_face
-
-                boxes, _, _ = yolov8_detector(frame)
-                if boxes is not None and len(boxes) > 0:
-                    first_box = boxes[0]
-                    object_width = first_box[2] - first_box[0]
-                    distance = distance_to_camera(KNOWN_WIDTH, focalLength, object_width)
-                    
-                    response_data.append({
-                        "Age": age,
-                        "Gender": dominant_gender,
-                        "Emotion": dominant_emotion,
-                        "Race": dominant_race,
-                        "Name": name,
-                        "Distance": distance
-                    })
-        
-        return response_data  
+        result = recognize_face(frame, collection, tuple(FACE_ATTRIBUTES))
+        if result and result["distance"] is not None:
+            response_data.append({
+                "Age": result["age"],
+                "Gender": result["gender"],
+                "Emotion": result["emotion"],
+                "Race": result["race"],
+                "Name": result["name"],
+                "Distance": result["distance"]
+            })
+        return response_data
 
     except Exception as e:
         print(f"Error in process_frame: {e}")
         return {"error": str(e)}
 
 if __name__ == "__main__":
-    calculate_focal_length(image_path)
+    load_deepface()
+    load_detector(image_path)
     
-    detect_and_analyze_face()
\ No newline at end of file
+    detect_and_analyze_face(continuous="--continuous" in sys.argv)
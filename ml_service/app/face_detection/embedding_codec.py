@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+# ---------------------------
+# Face embedding storage format
+# ---------------------------
+#
+# Version 1 documents hold `embedding` as a list of float64 numbers.
+# Version 2 documents hold it as raw little-endian bytes (BSON binary, which
+# pymongo produces from Python `bytes`), with `embedding_dtype` naming the
+# element type and, for int8, `embedding_scale` to undo the quantization.
+
+EMBEDDING_VERSION = 2
+# "float32" (lossless for the model output), "float16" or "int8" (per-vector symmetric scale).
+FACE_EMBEDDING_FORMAT = os.getenv("FACE_EMBEDDING_FORMAT", "float32")
+EMBEDDING_DTYPES = {"float32": "<f4", "float16": "<f2", "int8": "i1"}
+# Fields needed to decode an embedding, for projections.
+EMBEDDING_FIELDS = {"embedding": 1, "embedding_dtype": 1, "embedding_scale": 1}
+
+
+def encode_embedding(embedding, fmt: str = FACE_EMBEDDING_FORMAT) -> dict:
+    """Document fields storing `embedding` in the given format."""
+    if fmt not in EMBEDDING_DTYPES:
+        raise ValueError(f"Unknown embedding format {fmt!r}, expected one of {sorted(EMBEDDING_DTYPES)}")
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    fields = {"embedding_version": EMBEDDING_VERSION, "embedding_dtype": fmt}
+    if fmt == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        fields["embedding_scale"] = scale
+        vector = np.clip(np.rint(vector / scale), -127, 127)
+    fields["embedding"] = vector.astype(EMBEDDING_DTYPES[fmt]).tobytes()
+    return fields
+
+
+def decode_embedding(doc: dict) -> np.ndarray:
+    """The float32 embedding of a document in any storage version."""
+    stored = doc["embedding"]
+    if not isinstance(stored, (bytes, bytearray, memoryview)):
+        return np.asarray(stored, dtype=np.float32)  # version 1: list of numbers
+    fmt = doc.get("embedding_dtype", "float32")
+    vector = np.frombuffer(stored, dtype=EMBEDDING_DTYPES[fmt]).astype(np.float32)
+    if fmt == "int8":
+        vector *= doc.get("embedding_scale", 1.0)
+    return vector
@@ -0,0 +1,285 @@
+import fcntl
+import logging
+import os
+import pickle
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from .ann import ANN_BACKENDS, FACE_INDEX_BACKEND, make_backend
+from .embedding_codec import EMBEDDING_FIELDS, decode_embedding
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# In-memory face embedding index
+# ---------------------------
+
+MATCH_THRESHOLD = 0.5
+POLL_SECONDS = float(os.getenv("FACE_INDEX_POLL_SECONDS", "30"))
+# Directory for the on-disk snapshot; empty disables persistence.
+FACE_INDEX_PATH = os.getenv("FACE_INDEX_PATH", "")
+# Only these fields are needed to build or refresh the index.
+INDEX_PROJECTION = {"_id": 1, "name": 1, **EMBEDDING_FIELDS}
+# Writers stamp documents with `updated_at` so polling sees in-place updates;
+# each poll looks back this far past the last one to absorb clock skew between hosts.
+POLL_OVERLAP = timedelta(seconds=60)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class FaceMatch(NamedTuple):
+    id: object
+    name: str
+    similarity: float
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+class FaceIndex:
+    """Gallery embeddings in a vector search backend, plus the id/name of every face.
+
+    Faces get integer labels in the backend (see `ann.py`); this class maps
+    labels back to MongoDB ids and names. The default exact backend answers a
+    search with one matrix-vector product plus `argpartition`; `ivf` and
+    `hnsw` trade a little recall for speed on very large galleries.
+    """
+
+    def __init__(self, backend_name: str = FACE_INDEX_BACKEND):
+        self.backend_name = backend_name
+        self.backend = make_backend(backend_name)
+        self._lock = threading.Lock()
+        self._labels: dict = {}  # document id -> label
+        self._faces: dict = {}   # label -> (document id, name)
+        self._next_label = 0
+        self._synced_at = None  # when the last full load or poll started
+        self.loaded = False
+        self._sync_thread = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._faces)
+
+    def build(self, ids, names, embeddings):
+        """Replace the whole index."""
+        labels = np.arange(len(ids), dtype=np.int64)
+        backend = make_backend(self.backend_name)
+        backend.build(labels, normalize_rows(embeddings) if len(ids) else np.zeros((0, 0), np.float32))
+        with self._lock:
+            self.backend = backend
+            self._faces = {int(label): (doc_id, name) for label, doc_id, name in zip(labels, ids, names)}
+            self._labels = {doc_id: int(label) for label, doc_id in zip(labels, ids)}
+            self._next_label = len(ids)
+            self.loaded = True
+
+    def load(self, collection):
+        """Build the index from every document, fetching only id, name and embedding."""
+        ids, names, embeddings = [], [], []
+        started = utcnow()
+        for doc in collection.find({}, INDEX_PROJECTION):
+            if doc.get("embedding") is None:
+                continue
+            ids.append(doc["_id"])
+            names.append(doc.get("name"))
+            embeddings.append(decode_embedding(doc))
+        self.build(ids, names, embeddings)
+        self._synced_at = started
+        logger.info(f"Face index loaded with {len(ids)} faces")
+        return self
+
+    def add(self, doc_id, name: str, embedding):
+        """Insert or replace one face."""
+        self.add_many([doc_id], [name], [embedding])
+
+    def add_many(self, ids, names, embeddings):
+        vectors = normalize_rows(embeddings)
+        with self._lock:
+            stale = [self._labels.pop(doc_id) for doc_id in ids if doc_id in self._labels]
+            if stale:
+                self.backend.remove(np.asarray(stale))
+                for label in stale:
+                    self._faces.pop(label, None)
+            labels = np.arange(self._next_label, self._next_label + len(ids), dtype=np.int64)
+            self._next_label += len(ids)
+            self.backend.add(labels, vectors)
+            for label, doc_id, name in zip(labels, ids, names):
+                self._faces[int(label)] = (doc_id, name)
+                self._labels[doc_id] = int(label)
+
+    def remove(self, doc_id):
+        with self._lock:
+            label = self._labels.pop(doc_id, None)
+            if label is None:
+                return
+            self.backend.remove(np.asarray([label]))
+            self._faces.pop(label, None)
+
+    def search(self, embedding, k: int = 1, threshold: float = MATCH_THRESHOLD) -> list[FaceMatch]:
+        """Top-k faces by cosine similarity, best first, keeping those at or above `threshold`."""
+        labels, scores = self.backend.search(normalize_rows(embedding)[0], k)
+        matches = []
+        for label, score in zip(labels, scores):
+            face = self._faces.get(int(label))
+            if face is not None and score >= threshold:
+                matches.append(FaceMatch(face[0], face[1], float(score)))
+        return matches
+
+    def best(self, embedding, threshold: float = MATCH_THRESHOLD) -> Optional[FaceMatch]:
+        matches = self.search(embedding, 1, threshold)
+        return matches[0] if matches else None
+
+    # --- persistence ---
+
+    def save(self, path: str = FACE_INDEX_PATH) -> bool:
+        """Write the index to `path` (a directory), replacing any previous snapshot.
+
+        Every pre-fork worker saves on shutdown, so writers are serialized with
+        an exclusive lock on `<path>.lock`; a worker that finds it taken skips
+        its save, since the snapshot being written holds the same faces.
+        Returns whether this call wrote the snapshot.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(f"{path}.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info(f"Face index snapshot at {path} is being written by another process, skipping")
+                return False
+
+            tmp, old = f"{path}.tmp-{os.getpid()}", f"{path}.old-{os.getpid()}"
+            try:
+                shutil.rmtree(tmp, ignore_errors=True)
+                os.makedirs(tmp)
+                with self._lock:
+                    self.backend.save(tmp)
+                    with open(os.path.join(tmp, "faces.pkl"), "wb") as f:
+                        pickle.dump({"backend": self.backend_name, "faces": self._faces, "next_label": self._next_label,
+                                     "synced_at": self._synced_at}, f)
+                if os.path.exists(path):
+                    os.replace(path, old)
+                os.replace(tmp, path)
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+                shutil.rmtree(old, ignore_errors=True)
+        logger.info(f"Face index with {len(self)} faces saved to {path}")
+        return True
+
+    def load_snapshot(self, path: str = FACE_INDEX_PATH, mmap: bool = True) -> bool:
+        """Load a saved index, memory-mapping the vectors where the backend allows it."""
+        try:
+            with open(os.path.join(path, "faces.pkl"), "rb") as f:
+                meta = pickle.load(f)
+            if meta["backend"] != self.backend_name:
+                logger.info(f"Face index snapshot is {meta['backend']}, configured {self.backend_name}; rebuilding")
+                return False
+            backend = ANN_BACKENDS[self.backend_name].load(path, mmap)
+        except (OSError, EOFError, KeyError, pickle.UnpicklingError, ValueError) as e:
+            logger.info(f"No usable face index snapshot at {path}: {e}")
+            return False
+
+        with self._lock:
+            self.backend = backend
+            self._faces = meta["faces"]
+            self._labels = {doc_id: label for label, (doc_id, _) in self._faces.items()}
+            self._next_label = meta["next_label"]
+            # Snapshots from before `synced_at` was recorded re-read every stamped document once.
+            self._synced_at = meta.get("synced_at")
+            self.loaded = True
+        logger.info(f"Face index loaded {len(self)} faces from {path}")
+        return True
+
+    # --- keeping the index in sync with MongoDB ---
+
+    def start_sync(self, collection, poll_seconds: float = POLL_SECONDS):
+        """Follow changes made by other processes: a change stream, or polling if unsupported."""
+        if self._sync_thread is not None:
+            return
+        self._stop.clear()
+        self._sync_thread = threading.Thread(
+            target=self._sync, args=(collection, poll_seconds), name="face-index-sync", daemon=True)
+        self._sync_thread.start()
+
+    def stop_sync(self):
+        self._stop.set()
+        self._sync_thread = None
+
+    def _sync(self, collection, poll_seconds: float):
+        try:
+            self._watch(collection)
+        except Exception as e:
+            # Change streams need a replica set; a standalone server falls back to polling.
+            logger.info(f"Face index change stream unavailable ({e}), polling every {poll_seconds} s")
+        while not self._stop.wait(poll_seconds):
+            try:
+                self.poll(collection)
+            except Exception as e:
+                logger.warning(f"Face index refresh failed: {e}")
+
+    def _watch(self, collection):
+        with collection.watch(full_document="updateLookup") as stream:
+            # Anything written between the initial load and opening the stream.
+            self.poll(collection)
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is None:
+                    time.sleep(0.1)
+                    continue
+                operation = change["operationType"]
+                if operation == "delete":
+                    self.remove(change["documentKey"]["_id"])
+                elif operation in ("insert", "update", "replace"):
+                    doc = change.get("fullDocument")
+                    if doc and doc.get("embedding") is not None:
+                        self.add(doc["_id"], doc.get("name"), decode_embedding(doc))
+                elif operation in ("drop", "rename", "invalidate"):
+                    raise RuntimeError(f"collection {operation}")
+
+    def poll(self, collection):
+        """Apply changes since the last load or poll.
+
+        Inserts and deletes are found by diffing document ids; in-place updates
+        (a re-registration, a migrated embedding) by `updated_at`. Updates that
+        do not set `updated_at` are only seen through the change stream.
+        """
+        started = utcnow()
+        current = {doc["_id"] for doc in collection.find({}, {"_id": 1})}
+        with self._lock:
+            known = set(self._labels)
+        for doc_id in known - current:
+            self.remove(doc_id)
+        new_ids = list(current - known)
+        if new_ids:
+            for doc in collection.find({"_id": {"$in": new_ids}}, INDEX_PROJECTION):
+                if doc.get("embedding") is not None:
+                    self.add(doc["_id"], doc.get("name"), decode_embedding(doc))
+
+        since = {"$gte": self._synced_at - POLL_OVERLAP} if self._synced_at else {"$exists": True}
+        query = {"updated_at": since}
+        if new_ids:
+            query["_id"] = {"$nin": new_ids}
+        for doc in collection.find(query, INDEX_PROJECTION):
+            if doc.get("embedding") is not None:
+                self.add(doc["_id"], doc.get("name"), decode_embedding(doc))
+        self._synced_at = started
+
+    def stats(self) -> dict:
+        return {
+            "faces": len(self),
+            "backend": self.backend_name,
+            "bytes": self.backend.nbytes,
+            "loaded": self.loaded,
+            "syncing": self._sync_thread is not None,
+        }
+
+
+face_index = FaceIndex()
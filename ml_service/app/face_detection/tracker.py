@@ -0,0 +1,125 @@
+import itertools
+import os
+
+import numpy as np
+
+# ---------------------------
+# Face tracking across video frames
+# ---------------------------
+#
+# Detections are associated with tracks by IoU, falling back to centroid
+# distance for fast motion. A track keeps the identity found when its face was
+# last embedded, with a confidence that decays every frame (faster when the
+# box jumps); the face is embedded and matched again only when that
+# confidence drops below FACE_TRACK_MIN_CONFIDENCE.
+
+IOU_THRESHOLD = float(os.getenv("FACE_TRACK_IOU", "0.3"))
+# A detection this close to a track (in box diagonals) can still continue it.
+CENTROID_THRESHOLD = 0.5
+# Extra confidence decay for a track continued by centroid distance rather than overlap.
+CENTROID_PENALTY = 0.7
+MAX_MISSED_FRAMES = int(os.getenv("FACE_TRACK_MAX_MISSED", "15"))
+CONFIDENCE_DECAY = float(os.getenv("FACE_TRACK_DECAY", "0.97"))
+MIN_CONFIDENCE = float(os.getenv("FACE_TRACK_MIN_CONFIDENCE", "0.5"))
+
+
+def iou(a, b) -> float:
+    """Intersection over union of two (x, y, w, h) boxes."""
+    ix = max(0.0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def centroid_distance(a, b) -> float:
+    """Distance between box centres, in units of the larger box diagonal."""
+    dx = (a[0] + a[2] / 2) - (b[0] + b[2] / 2)
+    dy = (a[1] + a[3] / 2) - (b[1] + b[3] / 2)
+    diagonal = max(np.hypot(a[2], a[3]), np.hypot(b[2], b[3]), 1e-6)
+    return float(np.hypot(dx, dy) / diagonal)
+
+
+class Track:
+    def __init__(self, track_id: int, box):
+        self.id = track_id
+        self.box = tuple(box)
+        self.missed = 0
+        self.frames = 1
+        self.match = None       # FaceMatch from the last identification, None if unknown
+        self.confidence = 0.0   # trust in `match`; 0 means "identify on this frame"
+        self.identifications = 0
+
+    @property
+    def needs_identification(self) -> bool:
+        return self.confidence < MIN_CONFIDENCE
+
+    def identified(self, match):
+        self.match = match
+        self.confidence = 1.0
+        self.identifications += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "track_id": self.id,
+            "box": dict(zip(("x", "y", "w", "h"), (int(v) for v in self.box))),
+            "name": self.match.name if self.match else None,
+            "similarity": round(self.match.similarity, 3) if self.match else None,
+            "confidence": round(self.confidence, 3),
+        }
+
+
+class FaceTracker:
+    """Greedy IoU/centroid association of face boxes to tracks, frame by frame."""
+
+    def __init__(self, iou_threshold: float = IOU_THRESHOLD, max_missed: int = MAX_MISSED_FRAMES,
+                 decay: float = CONFIDENCE_DECAY):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.decay = decay
+        self.tracks: dict[int, Track] = {}
+        self._ids = itertools.count(1)
+
+    def _associate(self, boxes) -> dict:
+        """Map detection index -> track id, best pairs first."""
+        pairs = []
+        for track in self.tracks.values():
+            for i, box in enumerate(boxes):
+                overlap = iou(track.box, box)
+                if overlap >= self.iou_threshold:
+                    pairs.append((1 + overlap, i, track.id))
+                elif (distance := centroid_distance(track.box, box)) <= CENTROID_THRESHOLD:
+                    pairs.append((1 - distance, i, track.id))  # ranks below every IoU match
+        assigned, used = {}, set()
+        for _, i, track_id in sorted(pairs, reverse=True):
+            if i not in assigned and track_id not in used:
+                assigned[i] = track_id
+                used.add(track_id)
+        return assigned
+
+    def update(self, boxes) -> list[Track]:
+        """Advance one frame; returns the track for every detection, in order."""
+        assigned = self._associate(boxes)
+        result = []
+        for i, box in enumerate(boxes):
+            track_id = assigned.get(i)
+            if track_id is None:
+                track = Track(next(self._ids), box)
+                self.tracks[track.id] = track
+            else:
+                track = self.tracks[track_id]
+                # A jump only the centroid fallback could follow may be someone else.
+                moved = iou(track.box, box) < self.iou_threshold
+                track.confidence *= self.decay * (CENTROID_PENALTY if moved else 1.0)
+                track.box = tuple(box)
+                track.missed = 0
+                track.frames += 1
+            result.append(track)
+
+        seen = {track.id for track in result}
+        for track in list(self.tracks.values()):
+            if track.id not in seen:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    del self.tracks[track.id]
+        return result
@@ -1,10 +1,11 @@
-import base64
 import openai
 import logging
 from typing import Optional
 import os
 from dotenv import load_dotenv
 
+from ....utils.image import encode_image_base64
+
 load_dotenv()
 class OpenAIProvider:
     def __init__(self):
@@ -15,7 +16,7 @@ class OpenAIProvider:
     def encode_image(image_path: str) -> Optional[str]:
         try:
             with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+                return encode_image_base64(image_file.read(), task="image_captioning")
         except Exception as e:
             logging.error(f"Error encoding image: {str(e)}")
             return None
@@ -1,10 +1,10 @@
 import os
-import base64
 import logging
 from typing import Optional
 from dotenv import load_dotenv
 from openai import OpenAI
-from PIL import Image
+
+from ...utils.image import encode_image_base64, normalize_image
 
 load_dotenv()
 
@@ -17,23 +17,19 @@ class OpenAIProvider:
         self.logger = logging.getLogger(__name__)
 
     @staticmethod
-    def resize_image(image_path: str, max_size: int = 512) -> str:
-        """Resize the image to reduce its size."""
+    def resize_image(image_bytes: bytes, max_size: int = 512) -> bytes:
+        """Resize the image in memory to reduce its size."""
         try:
-            with Image.open(image_path) as img:
-                img.thumbnail((max_size, max_size))
-                resized_path = "resized_" + os.path.basename(image_path)
-                img.save(resized_path, format="JPEG")
-                return resized_path
+            return normalize_image(image_bytes, task="image_captioning", max_side=max_size)
         except Exception as e:
             logging.error(f"Error resizing image: {str(e)}")
             raise
 
     @staticmethod
-    def encode_image(image_path: str) -> Optional[str]:
+    def encode_image(image_path: str, max_size: int = 512) -> Optional[str]:
         try:
             with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+                return encode_image_base64(image_file.read(), task="image_captioning", max_side=max_size)
         except Exception as e:
             logging.error(f"Error encoding image: {str(e)}")
             return None
@@ -106,13 +102,7 @@ def main():
         logging.error(f"Image not found: {image_path}")
         return
 
-    try:
-        resized_path = provider.resize_image(image_path)
-    except Exception:
-        logging.error("Failed to resize image")
-        return
-
-    base64_image = provider.encode_image(resized_path)
+    base64_image = provider.encode_image(image_path)
     if not base64_image:
         logging.error("Failed to encode image")
         return
@@ -1,68 +1,258 @@
 import base64
 import cv2
-from fastapi import FastAPI, Form
+from fastapi import FastAPI, Form, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fpdf import FPDF
 import numpy as np
 import openai
 from pydantic import BaseModel, Json
-from sympy import content
 
-from app.article_reading.pipeline import execute_pipeline
+from app.article_reading.pipeline import aexecute_pipeline
 from app.question_answering.pipeline import ask_general_question
-from app.utils.audio import FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH, FEATURE_LABELS, FEATURE_NAMES, find_navigation_intent, route_query_semantically
-from app.utils.deepgram import transcribe_audio
-from .utils.formatter import create_pdf, create_pdf_async, format_article_audio_response, format_response_distance_estimate_with_openai, format_response_product_recognition_with_openai, format_audio_response
+from app.utils.audio import FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH, FEATURE_LABELS, FEATURE_NAMES, find_navigation_intent, get_keyword_index, route_query_semantically, route_transcript, route_transcript_by_keyword
+from app.utils.deepgram import transcribe_audio, transcription_stats
+from .utils.formatter import split_complete_sentences, create_pdf, create_pdf_async, format_article_audio_response, format_response_distance_estimate_with_openai, format_response_product_recognition_with_openai, format_audio_response
 from .currency_detection.yolov8.YOLOv8 import YOLOv8
 from .config import config
 from .text_recognition.provider.ocr.ocr import OcrRecognition
 import sys
 from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
 from tempfile import NamedTemporaryFile
-from .product_recognition.pipeline import BarcodeProcessor
-from deepface import DeepFace
 import time
-from .image_captioning.provider.gemini.gemini import gen_img_description
 import asyncio
-from .distance_estimate.stream_video_distance import calculate_focal_length_stream, calculate_distance_from_image
-from .face_detection.detectMongo import find_existing_face, process_frame, save_embedding_to_db, connect_mongodb, calculate_focal_length
+from .distance_estimate.stream_video_distance import calculate_distance_from_image, load_detector as load_distance_detector
+from .face_detection.detectMongo import FaceStream, expand_uploads, parse_attributes, recognize_face, register_faces, save_embedding_to_db, connect_mongodb, load_deepface, load_face_index, save_face_index, load_detector as load_face_detector
+from .face_detection.face_index import face_index
 import json
+import zipfile
 import mimetypes
 from .image_captioning.provider.gpt4.gpt4 import OpenAIProvider
 from fastapi import FastAPI, UploadFile, File
-from sentence_transformers import SentenceTransformer, util
 from dotenv import load_dotenv
 import os
 import tempfile
 import requests
 from collections import OrderedDict
-from .all_task.pipeline import get_llm_response
+from .all_task.pipeline import aget_llm_response, astream_llm_response
+from .all_task.response_cache import response_cache
+from .all_task.router import hedged_router
+from .utils.llm_clients import llm_registry
+from .utils.singleflight import singleflight_stats
+from .utils.embedding import embedding_service
+from .utils.image import encode_image_base64, image_stats
+from .utils.memory import process_memory
+from .utils.metrics import current_endpoint, metrics, request_seconds, requests_in_flight, stage
+from .utils.model_manager import ModelUnavailableError, model_manager
+from .utils.streaming_stt import get_stt_backend
+import contextlib
+from contextlib import asynccontextmanager
 
-start = time.time()
 # ocr = OcrRecognition()
 # currency_detection_model_path = "./models/best8.onnx"
 # currency_detector = YOLOv8(currency_detection_model_path, conf_thres=0.2, iou_thres=0.3)
 # barcode_processor = BarcodeProcessor()
 # distance_estimation_model_path = "./models/yolov8m.onnx"
-print(f"All Models loaded in {time.time() - start:.2f} seconds", file=sys.stderr)
 
-app = FastAPI()
+image_path = "./app/dis.jpg"
+
+
+def connect_face_db():
+    collection = connect_mongodb()
+    if collection is None:
+        raise RuntimeError("Database connection failed")
+    return collection
+
+
+# Models load in the background after startup; each endpoint waits only for the ones it uses.
+model_manager.register("distance_detector", lambda: load_distance_detector(image_path))
+model_manager.register("face_detector", lambda: load_face_detector(image_path))
+model_manager.register("face_db", connect_face_db)
+model_manager.register("face_index", lambda: load_face_index(model_manager.get("face_db")), depends_on=("face_db",))
+model_manager.register("deepface", load_deepface)
+model_manager.register("embedder", embedding_service.load, fork_safe=embedding_service.fork_safe)
+model_manager.register(
+    "routing_index",
+    lambda: get_keyword_index(model_manager.get("embedder"), FEATURE_LABELS),
+    depends_on=("embedder",),
+    fork_safe=embedding_service.fork_safe,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    model_manager.start()
+    # In the background: uvicorn accepts no connections until startup returns, and
+    # priming the provider pools makes network calls that can take seconds.
+    llm_warm_up = asyncio.create_task(llm_registry.warm_up())
+    yield
+    llm_warm_up.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await llm_warm_up
+    face_index.stop_sync()
+    save_face_index()
+    model_manager.shutdown()
+    await llm_registry.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 # Define allowed origins (frontend URLs)
 
+
+def route_label(scope) -> str:
+    """The matched route template, so metrics get one series per route rather than per URL.
+
+    Middleware runs before routing, so the route is resolved here. Paths that
+    match no route (scanners, typos) share the "unmatched" label.
+    """
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path  # right path, wrong method
+    return partial or "unmatched"
+
+
+@app.middleware("http")
+async def record_request_metrics(request, call_next):
+    endpoint = route_label(request.scope)
+    token = current_endpoint.set(endpoint)
+    requests_in_flight.inc(endpoint)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        request_seconds.observe(time.perf_counter() - start, endpoint, request.method, str(status))
+        requests_in_flight.dec(endpoint)
+        current_endpoint.reset(token)
+
+
+def collect_service_metrics():
+    cache = response_cache.stats()
+    pool = llm_registry.stats()
+    flights = singleflight_stats()
+    images = image_stats()
+    models = model_manager.status()
+    routing = hedged_router.stats()
+    embedding = embedding_service.stats()
+    stt = transcription_stats.snapshot()
+    return [
+        ("echosight_llm_cache_events_total", "counter", "Perceptual cache events per task.",
+         [({"task": task, "event": event}, value) for task, counters in cache["tasks"].items() for event, value in counters.items()]),
+        ("echosight_llm_cache_entries", "gauge", "Answers held in the perceptual cache.", [({}, cache["entries"])]),
+        ("echosight_llm_cache_bytes", "gauge", "Answer bytes held in the perceptual cache.", [({}, cache["bytes"])]),
+        ("echosight_llm_clients_total", "counter", "LLM client registry lookups.",
+         [({"result": "hit"}, pool["hits"]), ({"result": "miss"}, pool["misses"])]),
+        ("echosight_singleflight_calls_total", "counter", "Coalescing layer calls by outcome.",
+         [({"layer": layer, "outcome": outcome}, stats[outcome]) for layer, stats in flights.items() for outcome in ("executed", "coalesced")]),
+        ("echosight_image_bytes_total", "counter", "Image bytes before and after normalization.",
+         [({"task": task, "direction": direction}, stats[f"bytes_{direction}"]) for task, stats in images.items() for direction in ("in", "out")]),
+        ("echosight_llm_provider_latency_seconds", "gauge", "Rolling provider latency per task.",
+         [({"provider": p["provider"], "task": p["task"], "quantile": q}, p[key]) for p in routing["providers"] for q, key in (("0.5", "p50"), ("0.95", "p95")) if p[key] is not None]),
+        ("echosight_llm_provider_error_rate", "gauge", "Rolling provider error rate per task.",
+         [({"provider": p["provider"], "task": p["task"]}, p["error_rate"]) for p in routing["providers"]]),
+        ("echosight_llm_hedges_total", "counter", "Hedged duplicate requests fired.", [({}, routing["hedges"])]),
+        ("echosight_llm_provider_wins_total", "counter", "Routed calls answered per provider.",
+         [({"provider": provider}, wins) for provider, wins in routing["wins"].items()]),
+        ("echosight_embedding_cache_total", "counter", "Embedding cache lookups.",
+         [({"result": "hit"}, embedding["cache_hits"]), ({"result": "miss"}, embedding["cache_misses"])]),
+        ("echosight_embedding_batches_total", "counter", "Embedding forward passes.", [({}, embedding["batches"])]),
+        ("echosight_stt_audio_bytes_total", "counter", "Audio bytes received and uploaded for transcription.",
+         [({"direction": "in"}, stt["bytes_in"]), ({"direction": "out"}, stt["bytes_out"])]),
+        ("echosight_stt_no_speech_total", "counter", "Recordings without speech, not uploaded.", [({}, stt["no_speech"])]),
+        ("echosight_face_index_faces", "gauge", "Faces held in the in-memory index.", [({}, len(face_index))]),
+        ("echosight_process_memory_bytes", "gauge", "Memory of this worker process.",
+         [({"pid": str(os.getpid()), "kind": kind}, value) for kind, value in process_memory().items()]),
+        ("echosight_model_ready", "gauge", "1 when a model has finished loading.",
+         [({"model": name}, int(status["state"] == "ready")) for name, status in models.items()]),
+    ]
+
+
+metrics.register_collector(collect_service_metrics)
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    with stage("upload_read"):
+        return await file.read()
+
+
+async def encode_upload(image_data: bytes, task: str) -> str:
+    with stage("image_encode"):
+        return await asyncio.to_thread(encode_image_base64, image_data, task)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.exception_handler(ModelUnavailableError)
+async def model_unavailable_handler(request, exc: ModelUnavailableError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
 @app.get("/")
 async def read_root():
     return {"Hello": "World"}
 
+
+@app.get("/ready")
+async def readiness():
+    status_code = 200 if model_manager.is_ready() else 503
+    return JSONResponse(status_code=status_code, content={
+        "ready": status_code == 200,
+        "models": model_manager.status(),
+    })
+
+
+@app.get("/llm_pool")
+async def llm_pool_stats():
+    return llm_registry.stats()
+
+
+@app.get("/llm_cache")
+async def llm_cache_stats():
+    return response_cache.stats()
+
+
+@app.get("/llm_routing")
+async def llm_routing_stats():
+    return hedged_router.stats()
+
+
+@app.get("/singleflight")
+async def coalescing_stats():
+    return singleflight_stats()
+
+
+@app.get("/embedding")
+async def embedding_stats():
+    return embedding_service.stats()
+
+
+@app.get("/face_index")
+async def face_index_stats():
+    return face_index.stats()
+
+
+@app.get("/transcription")
+async def transcription_report():
+    return transcription_stats.snapshot()
+
 @app.post("/document_recognition")
 async def document_recognition(file: UploadFile = File(...)):
     try:
-        start = time.time()
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode("utf-8")
+        image_data = await read_upload(file)
+        base64_image = await encode_upload(image_data, "text_recognition")
 
-        result = get_llm_response(
+        result = await aget_llm_response(
             query="Extract text from this image.",
             task="text_recognition",
             base64_image=base64_image,
@@ -84,11 +274,10 @@ async def document_recognition(file: UploadFile = File(...)):
 @app.post("/currency_detection")
 async def currency_detection(file: UploadFile = File(...)):
     try:
-        start = time.time()
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode("utf-8")
+        image_data = await read_upload(file)
+        base64_image = await encode_upload(image_data, "currency_detection")
 
-        result = get_llm_response(
+        result = await aget_llm_response(
             query="Extract text from this image.",
             task="currency_detection",
             base64_image=base64_image,
@@ -110,11 +299,10 @@ async def currency_detection(file: UploadFile = File(...)):
 @app.post("/image_captioning")
 async def image_captioning(file: UploadFile = File(...)):
     try:
-        start = time.time()
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode("utf-8")
+        image_data = await read_upload(file)
+        base64_image = await encode_upload(image_data, "image_captioning")
 
-        result = get_llm_response(
+        result = await aget_llm_response(
             query="Extract text from this image.",
             task="image_captioning",
             base64_image=base64_image,
@@ -132,16 +320,26 @@ async def image_captioning(file: UploadFile = File(...)):
         print(f"Lỗi xảy ra: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+
+
+@app.post("/image_captioning/stream")
+async def image_captioning_stream(file: UploadFile = File(...)):
+    image_data = await read_upload(file)
+    base64_image = await encode_upload(image_data, "image_captioning")
+    return sse_response(stream_llm_events(
+        query="Extract text from this image.",
+        task="image_captioning",
+        base64_image=base64_image,
+    ))
     
 
 @app.post("/product_recognition")
 async def product_recognition(file: UploadFile = File(...)):
     try:
-        start = time.time()
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode("utf-8")
+        image_data = await read_upload(file)
+        base64_image = await encode_upload(image_data, "product_recognition")
 
-        result = get_llm_response(
+        result = await aget_llm_response(
             query="Extract product information from this image.",
             task="product_recognition",
             base64_image=base64_image,
@@ -159,24 +357,21 @@ async def product_recognition(file: UploadFile = File(...)):
         print(f"Lỗi xảy ra: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
-image_path = "./app/dis.jpg"  
-
-calculate_focal_length_stream(image_path)
-
 @app.post("/distance_estimate")
 async def calculate_distance(transcribe: str,file: UploadFile = File(...)):
-    image_data = await file.read()
-    base64_image = base64.b64encode(image_data).decode("utf-8")
+    image_data = await read_upload(file)
     np_arr = np.frombuffer(image_data, np.uint8)
     image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
     if image is None:
         raise HTTPException(status_code=400, detail="Invalid image file")
+    base64_image = await encode_upload(image_data, "distance_estimation")
+    await model_manager.wait_for("distance_detector")
     
-    results = calculate_distance_from_image(image_data)
+    results = await asyncio.to_thread(calculate_distance_from_image, image_data)
     print(results)
     if results is None:
         raise HTTPException(status_code=400, detail="Không thể xử lý ảnh.")
-    results = format_response_distance_estimate_with_openai(results, transcribe, base64_image)
+    results = await asyncio.to_thread(format_response_distance_estimate_with_openai, results, transcribe, base64_image)
     print(results)
     return JSONResponse(content={
         "description" : results
@@ -185,11 +380,10 @@ async def calculate_distance(transcribe: str,file: UploadFile = File(...)):
 @app.post("/distance_estimate_v2")
 async def distance_estimate(file: UploadFile = File(...)):
     try:
-        start = time.time()
-        image_data = await file.read()
-        base64_image = base64.b64encode(image_data).decode("utf-8")
+        image_data = await read_upload(file)
+        base64_image = await encode_upload(image_data, "distance_estimation")
 
-        result = get_llm_response(
+        result = await aget_llm_response(
             query="Extract navigational information from this image.",
             task="distance_estimation",
             base64_image=base64_image,
@@ -208,11 +402,6 @@ async def distance_estimate(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-collection = connect_mongodb()
-if collection is None:
-    raise HTTPException(status_code=500, detail="Database connection failed")
-calculate_focal_length(image_path)
-
 @app.post("/face_detection/register")
 async def register(
     name: str,
@@ -221,14 +410,17 @@ async def register(
     date_of_birth: str,
     file: UploadFile = File(...)
 ):
-    image_data = await file.read()
+    image_data = await read_upload(file)
     np_arr = np.frombuffer(image_data, np.uint8)
     image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
     if image is None:
         raise HTTPException(status_code=400, detail="Invalid image file")
 
+    DeepFace, collection, _ = await model_manager.wait_for("deepface", "face_db", "face_index")
+
     try:
-        embedding = DeepFace.represent(image, enforce_detection=False)[0]['embedding']
+        with stage("deepface_represent"):
+            embedding = DeepFace.represent(image, enforce_detection=False)[0]['embedding']
         
         save_embedding_to_db(
             collection, 
@@ -255,63 +447,149 @@ async def register(
         raise HTTPException(status_code=500, detail="Failed to process registration")
 
 
+@app.post("/face_detection/register_bulk")
+async def register_bulk(
+    name: str,
+    hometown: str,
+    relationship: str,
+    date_of_birth: str,
+    files: list[UploadFile] = File(...)
+):
+    """Register one person from many images, uploaded as separate files and/or zip archives."""
+    uploads = [(file.filename or f"image-{i}", await read_upload(file)) for i, file in enumerate(files)]
+    try:
+        images = expand_uploads(uploads)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    _, collection, _ = await model_manager.wait_for("deepface", "face_db", "face_index")
+
+    details = {"hometown": hometown, "relationship": relationship, "date_of_birth": date_of_birth}
+    try:
+        result = await asyncio.to_thread(register_faces, collection, name, images, details)
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=500, detail="Failed to process registration")
+    if not result["accepted"]:
+        raise HTTPException(status_code=422, detail={"message": "No usable face images", "rejected": result["rejected"]})
+
+    return JSONResponse(content={
+        **result,
+        "description": f"Đã đăng kí thành công nhận diện khuôn mặt đối với {name} từ {len(result['accepted'])} ảnh, với thông tin như sau: Quê quán: {hometown}, Mối quan hệ với người dùng {relationship}, ngày tháng năm sinh: {date_of_birth}"
+    })
+
+
 # Recognition Endpoint
 @app.post("/face_detection/recognize")
-async def recognize(file: UploadFile = File(...)):
-    image_data = await file.read()
+async def recognize(file: UploadFile = File(...), attributes: str | None = None):
+    """Recognize the face in an image.
+
+    `attributes` opts into attribute analysis: a comma-separated subset of
+    age, gender, emotion and race, or "all". By default none are computed.
+    """
+    try:
+        attributes = parse_attributes(attributes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    image_data = await read_upload(file)
     np_arr = np.frombuffer(image_data, np.uint8)
     image = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
     if image is None:
         raise HTTPException(status_code=400, detail="Invalid image file")
 
-    # Generate the embedding
+    _, collection, _, _ = await model_manager.wait_for("deepface", "face_db", "face_detector", "face_index")
+
     try:
-        embedding = DeepFace.represent(image, enforce_detection=False)[0]['embedding']
+        result = await asyncio.to_thread(recognize_face, image, collection, attributes)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate embedding: {e}")
+        print(f"Error in recognition endpoint: {e}")
+        raise HTTPException(status_code=500, detail="Failed to process recognition")
+    if result is None:
+        raise HTTPException(status_code=404, detail="Face not recognized")
+
+    print(result)
+    distance = f", cách bạn khoảng {result['distance']} inch" if result["distance"] is not None else ""
+    return JSONResponse(content={
+        **result,
+        "message": "Recognition successful",
+        "description": f"Nhận diện thành công. Đây là {result['name']}{distance}, quê quán: {result['hometown']}, mối quan hệ với bạn là {result['relationship']}"
+    })
 
+
+@app.websocket("/face_detection/stream")
+async def stream_face_recognition(websocket: WebSocket):
+    """Continuous face recognition for a live camera.
+
+    The client sends encoded frames (JPEG/PNG) as binary messages and
+    `{"type": "end"}` when done. Every processed frame gets a `tracks` event;
+    the first time a registered person is recognized there is also an
+    `announce` event with a spoken `description`. A frame that arrives while
+    another is processed replaces any frame still waiting, so a slow server
+    skips frames instead of falling behind.
+    """
+    await websocket.accept()
+    current_endpoint.set("/face_detection/stream")
     try:
-        # Process the frame to get response data
-        response_data = process_frame(image, collection)
-        if "error" in response_data:
-            raise HTTPException(status_code=500, detail=response_data['error'])
-        
-        if response_data:
-            data = response_data[0]
-            recognized_name = data.get('Name', 'Unknown')
-            
-            # Find existing face and retrieve additional details
-            face_match = find_existing_face(collection, np.array(embedding))
-            if face_match:
-                matched_name, similarity_score = face_match
-                matched_face = collection.find_one({"name": matched_name})
-                
-                hometown = matched_face.get("hometown", "Unknown")
-                relationship = matched_face.get("relationship", "Unknown")
-                date_of_birth = matched_face.get("date_of_birth", "Unknown")
-                result =  {
-                    "message": "Recognition successful",
-                    "name": recognized_name,
-                    "matched_name": matched_name,
-                    "similarity_score": similarity_score.item(),
-                    "age": data.get('Age'),
-                    "gender": data.get('Gender'),
-                    "emotion": data.get('Emotion'),
-                    "race": data.get('Race'),
-                    "distance": data.get('Distance').item(),
-                    "hometown": hometown,
-                    "relationship": relationship,
-                    "date_of_birth": date_of_birth
-                }
-                print(result)
-                return JSONResponse(content= {
-                    "description": f"Nhận diện thành công. Đây là {recognized_name}, cách bạn khoảng {data.get('Distance').item()} inch, quê quán: {hometown}, mối quan h��� với bạn là {relationship}"
+        _, collection, _ = await model_manager.wait_for("deepface", "face_db", "face_index")
+    except ModelUnavailableError as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close()
+        return
+
+    stream = FaceStream(collection)
+    frames: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    def offer(item):
+        with contextlib.suppress(asyncio.QueueEmpty):
+            frames.get_nowait()  # drop the stale frame
+        frames.put_nowait(item)
+
+    async def receive_frames():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    offer(message["bytes"])
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                    except json.JSONDecodeError:
+                        await websocket.send_json({"type": "error", "error": "Invalid control message"})
+                        continue
+                    if isinstance(control, dict) and control.get("type") == "end":
+                        break
+        finally:
+            offer(None)
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while (data := await frames.get()) is not None:
+            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                await websocket.send_json({"type": "error", "error": "Invalid image frame"})
+                continue
+            tracks, announcements = await asyncio.to_thread(stream.process, frame)
+            await websocket.send_json({"type": "tracks", "frame": stream.frames, "tracks": tracks})
+            for announcement in announcements:
+                await websocket.send_json({
+                    "type": "announce",
+                    **announcement,
+                    "description": f"Đây là {announcement['name']}, quê quán: {announcement['hometown']}, mối quan hệ với bạn là {announcement['relationship']}"
                 })
-        else:
-            raise HTTPException(status_code=404, detail="Face not recognized")
+        await websocket.send_json({"type": "end", **stream.stats()})
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
-        print(f"Error in recognition endpoint: {e}")
-        raise HTTPException(status_code=404, detail="Failed to process recognition")
+        print("❌ Error in face stream:", e)
+        with contextlib.suppress(Exception):
+            await websocket.send_json({"type": "error", "error": "Failed to process frame."})
+    finally:
+        await stop_helper_task(receiver, websocket, "receiving frames")
+        with contextlib.suppress(RuntimeError):
+            await websocket.close()  # unless the client already closed it
 
 
 @app.post("music_detection")
@@ -333,8 +611,6 @@ async def music_detection(file: UploadFile = File(...)):
         print(e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-
 # --- Modified API Endpoint ---
 # @app.post("/transcribe_audio_v2")
 async def process_voice_command(file: UploadFile = File(...), current_feature: str | None = None):
@@ -351,11 +627,12 @@ async def process_voice_command(file: UploadFile = File(...), current_feature: s
         target feature, confidence score, and original query text if applicable.
     """
     with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp:
-        tmp.write(await file.read())
+        tmp.write(await read_upload(file))
         tmp_path = tmp.name
 
     try:
-        transcript_result = transcribe_audio(tmp_path)
+        with stage("transcription"):
+            transcript_result = await asyncio.to_thread(transcribe_audio, tmp_path)
 
         if not transcript_result or "transcript" not in transcript_result:
              raise HTTPException(status_code=500, detail="Transcription failed.")
@@ -413,7 +690,9 @@ async def process_voice_command(file: UploadFile = File(...), current_feature: s
 
         # Option B: Context unknown or it's a query needing routing
         # Use semantic similarity to find the best feature *for the query*
-        semantic_routing_result = route_query_semantically(
+        embedder, _ = await model_manager.wait_for("embedder", "routing_index")
+        semantic_routing_result = await asyncio.to_thread(
+            route_query_semantically,
             transcript_text,
             embedder,
             FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH # Use the detailed keywords here
@@ -427,6 +706,8 @@ async def process_voice_command(file: UploadFile = File(...), current_feature: s
             "query": semantic_routing_result["query"]
         }
 
+    except ModelUnavailableError:
+        raise  # answered with 503 by model_unavailable_handler
     except Exception as e:
         print(f"❌ Error processing voice command: {e}")
         # Log the exception traceback for debugging
@@ -448,63 +729,148 @@ async def voice_command(
     current_feature: Annotated[str, Form()]
     ):
     with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp:
-        tmp.write(await file.read())
+        tmp.write(await read_upload(file))
         tmp_path = tmp.name
 
     try:
-        transcript_result = transcribe_audio(tmp_path)
+        with stage("transcription"):
+            transcript_result = await asyncio.to_thread(transcribe_audio, tmp_path)
         transcript_text = transcript_result.get("transcript", "").lower()
 
         print("Transcript:", transcript_text)
         print("Current Feature:", current_feature)
 
         # Step 1: Exact keyword match
-        for label, keywords in FEATURE_LABELS.items():
-            for keyword in keywords:
-                if keyword.lower() in transcript_text:
-                    if label == current_feature:
-                        if "read" not in transcript_text.lower():
-                            return {
-                                "command": current_feature,
-                                "intent": "query",
-                                "confidence": 0.9,  # high confidence
-                                "query": transcript_text
-                            }
-                        else:
-                            return {
-                                "command": current_feature,
-                                "intent": "read",
-                                "confidence": 0.9,  # high confidence
-                                "query": transcript_text
-                            }
-                        
-                    return {
-                        "command": label,
-                        "intent": "navigate",
-                        "confidence": 1.0,  # exact match = high confidence
-                        "query": transcript_text
-                    }
+        result = route_transcript_by_keyword(transcript_text, current_feature)
+        if result is not None:
+            return result
 
         # Step 2: Semantic similarity fallback
-        transcript_embed = embedder.encode(transcript_text, convert_to_tensor=True)
-        best_match, best_score = None, -1
+        embedder, _ = await model_manager.wait_for("embedder", "routing_index")
+        with stage("semantic_routing"):
+            return await asyncio.to_thread(route_transcript, transcript_text, current_feature, embedder)
+    except ModelUnavailableError:
+        raise  # answered with 503 by model_unavailable_handler
+    except Exception as e:
+        print("❌ Error:", e)
+        return {"error": "Failed to process audio."}
 
-        for label, phrases in FEATURE_LABELS.items():
-            for phrase in phrases:
-                phrase_embed = embedder.encode(phrase, convert_to_tensor=True)
-                score = util.cos_sim(transcript_embed, phrase_embed).item()
-                if score > best_score:
-                    best_match, best_score = label, score
 
-        return {
-            "command": best_match,
-            "intent": "navigate",
-            "confidence": round(best_score, 3),
-            "query": transcript_text
-        }
+# Models and LLM pools each feature needs, warmed as soon as an interim transcript reveals the intent.
+FEATURE_MODELS = {
+    "Distance": ("distance_detector",),
+    "Face": ("face_detector", "deepface", "face_db", "face_index"),
+}
+LLM_FEATURES = {"News", "Chatbot", "Text", "Currency", "Object", "Product", "Distance", "Capture", "Detect"}
+
+
+async def stop_helper_task(task: asyncio.Task, websocket: WebSocket, action: str):
+    """Cancel a WebSocket helper task and wait for it, reporting an error it hit instead of losing it."""
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    except Exception as e:
+        print(f"❌ Error {action}:", e)
+        with contextlib.suppress(Exception):
+            await websocket.send_json({"type": "error", "error": f"Failed {action}."})
+
+
+async def warm_feature(feature: str):
+    try:
+        if feature in FEATURE_MODELS:
+            await asyncio.to_thread(model_manager.warm, *FEATURE_MODELS[feature])
+        if feature in LLM_FEATURES:
+            await llm_registry.warm_up()
+    except Exception as e:
+        print(f"Failed to warm up {feature}: {e}")
+
+
+@app.websocket("/transcribe_audio/stream")
+async def stream_voice_command(websocket: WebSocket, current_feature: str = ""):
+    """Streaming counterpart of `/transcribe_audio`.
+
+    The client sends binary audio chunks and a text message `{"type": "end"}`
+    when the user stops talking. The server answers with `transcript` events
+    (interim and final), an `intent` event as soon as the keyword router
+    recognizes a command in an interim transcript (the target feature is warmed
+    at that point), and one `result` event with the same body `/transcribe_audio`
+    returns.
+    """
+    await websocket.accept()
+    current_endpoint.set("/transcribe_audio/stream")
+    try:
+        session = await get_stt_backend().open_session(dict(websocket.query_params))
+    except Exception as e:
+        print("❌ Error opening STT stream:", e)
+        await websocket.send_json({"type": "error", "error": "Failed to start transcription."})
+        await websocket.close()
+        return
+
+    async def forward_audio():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    await session.send(message["bytes"])
+                elif message.get("text"):
+                    try:
+                        control = json.loads(message["text"])
+                    except json.JSONDecodeError:
+                        await websocket.send_json({"type": "error", "error": "Invalid control message"})
+                        continue
+                    if isinstance(control, dict) and control.get("type") == "end":
+                        break
+        finally:
+            await session.finish()
+
+    forwarder = asyncio.create_task(forward_audio())
+    warm_tasks = set()
+    final_segments, early = [], None
+    try:
+        with stage("streaming_transcription"):
+            async for event in session.events():
+                if event.is_final:
+                    final_segments.append(event.text)
+                transcript_text = " ".join(final_segments + ([] if event.is_final else [event.text])).strip()
+                await websocket.send_json({"type": "transcript", "text": transcript_text, "is_final": event.is_final})
+
+                # Early routing: the keyword step is cheap enough to run on every interim result.
+                result = route_transcript_by_keyword(transcript_text, current_feature)
+                if result is not None and (early is None or result["command"] != early["command"]):
+                    early = result
+                    task = asyncio.create_task(warm_feature(result["command"]))
+                    warm_tasks.add(task)
+                    task.add_done_callback(warm_tasks.discard)
+                    await websocket.send_json({"type": "intent", "is_final": event.is_final, **result})
+
+        if forwarder.done() and not forwarder.cancelled() and forwarder.exception() is not None:
+            return  # the audio was cut short; stop_helper_task reports the error
+        transcript_text = " ".join(final_segments).strip().lower()
+        if not transcript_text:
+            await websocket.send_json({"type": "error", "error": "No transcript detected."})
+            return
+
+        result = route_transcript_by_keyword(transcript_text, current_feature)
+        if result is None:
+            embedder, _ = await model_manager.wait_for("embedder", "routing_index")
+            with stage("semantic_routing"):
+                result = await asyncio.to_thread(route_transcript, transcript_text, current_feature, embedder)
+        await websocket.send_json({"type": "result", **result})
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print("❌ Error:", e)
-        return {"error": "Failed to process audio."}
+        with contextlib.suppress(Exception):
+            await websocket.send_json({"type": "error", "error": "Failed to process audio."})
+    finally:
+        await stop_helper_task(forwarder, websocket, "receiving audio")
+        await session.close()
+        with contextlib.suppress(RuntimeError):
+            await websocket.close()  # unless the client already closed it
 
 
 class NewsQuery(BaseModel):
@@ -524,7 +890,7 @@ async def article_reading(news_query: str = Form(...)):
         if "error" in news_query:
             raise HTTPException(status_code=400, detail="Failed to transcribe audio")
         
-        articles = execute_pipeline(news_query)
+        articles = await aexecute_pipeline(news_query)
 
         if not articles:
             raise HTTPException(status_code=400, detail="No valid articles found")
@@ -555,14 +921,14 @@ async def general_qa(message: str = Form(...)):
     try:
 
         # Step 3: Ask the LLM to answer the question
-        answer = get_llm_response(
+        answer = await aget_llm_response(
             query=message,
             task="general_question_answering",
             base64_image=None
         )
 
         # Step 4: Convert answer back to speech
-        audio_path = format_audio_response(answer, "general_question_answering")
+        audio_path = await asyncio.to_thread(format_audio_response, answer, "general_question_answering")
 
         if audio_path:
             return JSONResponse(content={
@@ -576,6 +942,50 @@ async def general_qa(message: str = Form(...)):
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.post("/general_question_answering/stream")
+async def general_qa_stream(message: str = Form(...)):
+    """Streaming variant of /general_question_answering for clients that speak as text arrives."""
+    return sse_response(stream_llm_events(
+        query=message,
+        task="general_question_answering",
+    ))
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    return StreamingResponse(events, media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+async def stream_llm_events(query: str, task: str, base64_image=None):
+    """Server-Sent Events for an LLM answer.
+
+    Emits a `token` event per chunk, a `sentence` event as soon as a sentence is
+    complete (so the client can start speaking), then `done` with the full text.
+    """
+    buffer, answer = "", []
+    try:
+        async for token in astream_llm_response(query=query, task=task, base64_image=base64_image):
+            answer.append(token)
+            yield sse_event("token", {"text": token})
+
+            sentences, buffer = split_complete_sentences(buffer + token)
+            for sentence in sentences:
+                yield sse_event("sentence", {"text": sentence})
+
+        if buffer.strip():
+            yield sse_event("sentence", {"text": buffer.strip()})
+        yield sse_event("done", {"text": "".join(answer).strip()})
+    except Exception as e:
+        print(f"Error while streaming {task}: {e}")
+        yield sse_event("error", {"detail": "Internal server error"})
+
+
 @app.get("/download_pdf")
 async def download_pdf(pdf_path: str):
     return FileResponse(pdf_path, media_type="application/pdf", filename="document.pdf")
@@ -1,19 +1,20 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.responses import JSONResponse
-from sentence_transformers import SentenceTransformer, util
 import tempfile
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 import re
 import logging
 from enum import Enum
-import torch
 from pydantic import BaseModel
 
+from ..utils.embedding import embedding_service
+from ..utils.keyword_matcher import KeywordMatcher
+
 app = FastAPI()
 
-# Initialize sentence transformer
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+# Shared with the main service: one model, batched and cached encodes
+embedder = embedding_service
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -107,26 +108,49 @@ FEATURES = {
     },
 }
 
-# Create consolidated embeddings for each feature and action
-feature_embeddings = {}
-action_embeddings = {}
-
-def initialize_embeddings():
-    """Precompute embeddings for features and actions"""
-    for feature, config in FEATURES.items():
+# Feature and action embeddings, stacked so a batch of transcripts is scored
+# with one matrix product per table
+class CommandTables:
+    def __init__(self, features):
+        self.features = list(features)
         # Combine feature name and all keywords for richer feature representation
-        feature_text = f"{feature} " + " ".join(config["keywords"])
-        feature_embeddings[feature] = embedder.encode(feature_text, convert_to_tensor=True)
-        
-        # Create embeddings for each action in this feature
-        action_embeddings[feature] = {}
-        for action, phrases in config["actions"].items():
-            # Combine action name and all phrases for richer action representation
-            action_text = f"{action} " + " ".join(phrases)
-            action_embeddings[feature][action] = embedder.encode(action_text, convert_to_tensor=True)
+        feature_texts = [f"{feature} " + " ".join(config["keywords"]) for feature, config in features.items()]
+
+        # All actions of all features, grouped by feature; `action_feature` maps rows back
+        self.actions, self.action_feature, action_texts = [], [], []
+        for i, (feature, config) in enumerate(features.items()):
+            for action, phrases in config["actions"].items():
+                self.actions.append(action)
+                self.action_feature.append(i)
+                # Combine action name and all phrases for richer action representation
+                action_texts.append(f"{action} " + " ".join(phrases))
+        self.action_feature = np.asarray(self.action_feature)
+
+        vectors = embedder.encode(feature_texts + action_texts)
+        self.feature_matrix = np.ascontiguousarray(vectors[:len(feature_texts)])  # (features, dim)
+        self.action_matrix = np.ascontiguousarray(vectors[len(feature_texts):])   # (actions, dim)
+
+    def feature_index(self, feature: Optional[str]) -> int:
+        return self.features.index(feature) if feature in self.features else -1
 
-# Initialize embeddings on startup
-initialize_embeddings()
+    def score(self, transcript_embeddings: np.ndarray, active_features: List[int]):
+        """Best feature and best action within each row's active feature.
+
+        Returns (feature_ids, feature_scores, action_ids, action_scores); action
+        scores are -inf for rows without an active feature.
+        """
+        feature_scores = transcript_embeddings @ self.feature_matrix.T
+        action_scores = transcript_embeddings @ self.action_matrix.T
+        active = np.asarray(active_features)[:, None]
+        action_scores = np.where(self.action_feature[None, :] == active, action_scores, -np.inf)
+
+        rows = np.arange(len(transcript_embeddings))
+        feature_ids = feature_scores.argmax(axis=1)
+        action_ids = action_scores.argmax(axis=1)
+        return feature_ids, feature_scores[rows, feature_ids], action_ids, action_scores[rows, action_ids]
+
+
+command_tables = CommandTables(FEATURES)
 
 def preprocess_transcript(transcript: str) -> str:
     """Clean and normalize transcript text"""
@@ -149,110 +173,107 @@ def detect_command(transcript: str, active_feature: Optional[str] = None) -> Mat
     Returns:
         MatchResult object with command, type, and confidence score
     """
-    # Preprocess the transcript
-    clean_transcript = preprocess_transcript(transcript)
-    transcript_embedding = embedder.encode(clean_transcript, convert_to_tensor=True)
+    return detect_commands([transcript], [active_feature])[0]
+
+def detect_commands(transcripts: List[str], active_features: Optional[List[Optional[str]]] = None) -> List[MatchResult]:
+    """
+    Batch version of `detect_command`: one encode and one scoring pass for all transcripts
     
-    # If we have an active feature, first check if this is an action for that feature
-    if active_feature and active_feature in FEATURES:
-        # Check for actions in the active feature
-        best_action, best_action_score = find_best_action(
-            transcript_embedding, 
-            active_feature
-        )
+    Args:
+        transcripts: Transcribed texts, e.g. a day of logged voice commands
+        active_features: Feature active for each transcript (None entries or None for all)
         
-        # If we found a good action match, return it
-        if best_action_score > 0.6:  # Threshold for action confidence
-            return MatchResult(
-                command=best_action,
+    Returns:
+        One MatchResult per transcript, identical to calling `detect_command` on each
+    """
+    if not transcripts:
+        return []
+    active_features = active_features or [None] * len(transcripts)
+    clean_transcripts = [preprocess_transcript(transcript) for transcript in transcripts]
+    transcript_embeddings = np.atleast_2d(embedder.encode(clean_transcripts))
+
+    active_ids = [command_tables.feature_index(feature) for feature in active_features]
+    feature_ids, feature_scores, action_ids, action_scores = command_tables.score(transcript_embeddings, active_ids)
+
+    results = []
+    for i, transcript in enumerate(transcripts):
+        # If we have an active feature, first check if this is an action for that feature
+        # (threshold for action confidence)
+        if active_ids[i] >= 0 and action_scores[i] > 0.6:
+            results.append(MatchResult(
+                command=command_tables.actions[action_ids[i]],
                 command_type=CommandType.ACTION,
-                confidence=float(best_action_score),
+                confidence=float(action_scores[i]),
                 original_transcript=transcript
-            )
-    
-    # Check for feature match
-    best_feature, best_feature_score = find_best_feature(transcript_embedding)
-    
-    # Always default to checking for an explicit feature mention first
-    # Only if confidence is high enough, consider it a feature selection
-    if best_feature_score > 0.6:  # Threshold for feature confidence
-        return MatchResult(
-            command=best_feature,
-            command_type=CommandType.FEATURE,
-            confidence=float(best_feature_score),
+            ))
+            continue
+
+        # Only if confidence is high enough, consider it a feature selection
+        if feature_scores[i] > 0.6:  # Threshold for feature confidence
+            results.append(MatchResult(
+                command=command_tables.features[feature_ids[i]],
+                command_type=CommandType.FEATURE,
+                confidence=float(feature_scores[i]),
+                original_transcript=transcript
+            ))
+            continue
+
+        # If nothing matched with high confidence, check for direct phrase matches
+        direct_match = check_direct_phrase_match(clean_transcripts[i])
+        if direct_match:
+            results.append(direct_match)
+            continue
+
+        # If we reach here, we couldn't determine a clear command
+        results.append(MatchResult(
+            command="unknown",
+            command_type=CommandType.FEATURE if active_features[i] is None else CommandType.ACTION,
+            confidence=0.0,
             original_transcript=transcript
-        )
-    
-    # If nothing matched with high confidence, check for direct phrase matches
-    direct_match = check_direct_phrase_match(clean_transcript)
-    if direct_match:
-        return direct_match
-    
-    # If we reach here, we couldn't determine a clear command
-    return MatchResult(
-        command="unknown",
-        command_type=CommandType.FEATURE if active_feature is None else CommandType.ACTION,
-        confidence=0.0,
-        original_transcript=transcript
-    )
+        ))
 
-def find_best_feature(transcript_embedding: torch.Tensor) -> Tuple[str, float]:
-    """Find the best matching feature for a transcript embedding"""
-    best_feature, best_score = None, -1
-    
-    for feature, embedding in feature_embeddings.items():
-        score = float(util.cos_sim(transcript_embedding, embedding).item())
-        if score > best_score:
-            best_feature, best_score = feature, score
-    
-    return best_feature, best_score
+    return results
+
+# Direct phrase matches, in the order they used to be checked within a feature:
+# feature name, then feature keywords, then action phrases.
+DIRECT_MATCH_KINDS = (
+    (CommandType.FEATURE, 1.0),   # Direct match gets highest confidence
+    (CommandType.FEATURE, 0.9),   # Keyword match gets high confidence
+    (CommandType.ACTION, 0.85),   # Action phrase match gets good confidence
+)
+
+
+def build_direct_phrase_matcher() -> KeywordMatcher:
+    patterns = []
+    for feature_rank, (feature, config) in enumerate(FEATURES.items()):
+        patterns.append((feature, (feature, 0), (feature_rank, 0)))
+        patterns += [(keyword, (feature, 1), (feature_rank, 1)) for keyword in config["keywords"]]
+        patterns += [
+            (phrase, (action, 2), (feature_rank, 2))
+            for action, phrases in config["actions"].items()
+            for phrase in phrases
+        ]
+    return KeywordMatcher(patterns)
+
+
+direct_phrase_matcher = build_direct_phrase_matcher()
 
-def find_best_action(transcript_embedding: torch.Tensor, feature: str) -> Tuple[str, float]:
-    """Find the best matching action for a transcript embedding within a feature"""
-    best_action, best_score = None, -1
-    
-    for action, embedding in action_embeddings[feature].items():
-        score = float(util.cos_sim(transcript_embedding, embedding).item())
-        if score > best_score:
-            best_action, best_score = action, score
-    
-    return best_action, best_score
 
 def check_direct_phrase_match(transcript: str) -> Optional[MatchResult]:
     """Check for direct matches of feature or action phrases in the transcript"""
-    # First check for exact feature matches
-    for feature, config in FEATURES.items():
-        # Check feature name itself
-        if feature.lower() in transcript:
-            return MatchResult(
-                command=feature,
-                command_type=CommandType.FEATURE,
-                confidence=1.0,  # Direct match gets highest confidence
-                original_transcript=transcript
-            )
-        
-        # Check feature keywords
-        for keyword in config["keywords"]:
-            if keyword.lower() in transcript:
-                return MatchResult(
-                    command=feature,
-                    command_type=CommandType.FEATURE,
-                    confidence=0.9,  # Keyword match gets high confidence
-                    original_transcript=transcript
-                )
-        
-        # Check action phrases
-        for action, phrases in config["actions"].items():
-            for phrase in phrases:
-                if phrase.lower() in transcript:
-                    return MatchResult(
-                        command=action,
-                        command_type=CommandType.ACTION,
-                        confidence=0.85,  # Action phrase match gets good confidence
-                        original_transcript=transcript
-                    )
-    
-    return None
+    # Longest whole-word phrase wins; ties go to the earlier feature
+    match = direct_phrase_matcher.best(transcript)
+    if match is None:
+        return None
+
+    command, kind = match.payload
+    command_type, confidence = DIRECT_MATCH_KINDS[kind]
+    return MatchResult(
+        command=command,
+        command_type=command_type,
+        confidence=confidence,
+        original_transcript=transcript
+    )
 
 @app.post("/transcribe_audio")
 async def voice_command(file: UploadFile = File(...), active_feature: Optional[str] = None):
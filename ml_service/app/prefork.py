@@ -0,0 +1,164 @@
+"""
+Pre-fork production launcher.
+
+The master process imports the app, loads the fork-safe models (read-only
+weights such as the sentence embedder) once, freezes the GC so it does not
+touch those pages, binds the listening socket and forks the workers. Workers
+share the preloaded weights copy-on-write and load everything that cannot
+cross a fork (ONNX Runtime sessions, DeepFace/TensorFlow, MongoDB and HTTP
+clients) in their own lifespan.
+
+Usage (from ml_service/):
+    python -m app.prefork --workers 4 --port 8000
+
+Send SIGUSR1 to the master to print the per-worker memory report on demand.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from .utils.memory import format_memory_report, process_memory
+from .utils.model_manager import model_manager
+
+logger = logging.getLogger("prefork")
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str):
+    # Signal handlers, threads and locks inherited from the master are not ours to use.
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    model_manager.after_fork()
+
+    config = uvicorn.Config(app, lifespan="on", log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Master:
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str, report_interval: float):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.report_interval = report_interval
+        self.children: dict[int, int] = {}  # pid -> worker index
+        self.stopping = False
+        self.report_requested = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.app, self.sock, self.log_level)
+            finally:
+                os._exit(0)
+        self.children[pid] = index
+        logger.info(f"Started worker {index} (pid {pid})")
+
+    def memory_report(self) -> str:
+        rows = [("master", os.getpid(), process_memory())]
+        for pid, index in sorted(self.children.items(), key=lambda item: item[1]):
+            rows.append((f"worker-{index}", pid, process_memory(pid)))
+        return format_memory_report(rows)
+
+    def handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def handle_report(self, signum, frame):
+        self.report_requested = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.handle_stop)
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGUSR1, self.handle_report)
+
+        for index in range(self.workers):
+            self.spawn(index)
+
+        last_report = time.monotonic()
+        while not self.stopping:
+            time.sleep(1)
+
+            # Replace workers that died.
+            while True:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if pid == 0:
+                    break
+                index = self.children.pop(pid, None)
+                if index is not None and not self.stopping:
+                    logger.warning(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+                    self.spawn(index)
+
+            if self.report_requested or (self.report_interval and time.monotonic() - last_report >= self.report_interval):
+                print(self.memory_report(), file=sys.stderr, flush=True)
+                self.report_requested = False
+                last_report = time.monotonic()
+
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("Stopping workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.children):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.children.clear()
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork launcher for the ML service")
+    parser.add_argument("--host", default=os.getenv("HOST") or "0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT") or 8000))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY") or 2))
+    parser.add_argument("--no-preload", action="store_true", help="load every model in the workers")
+    parser.add_argument("--memory-report-interval", type=float, default=300.0,
+                        help="seconds between memory reports, 0 to only report on SIGUSR1")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+
+    from .main import app
+
+    if not args.no_preload:
+        start = time.perf_counter()
+        model_manager.preload_fork_safe()
+        logger.info(f"Preloaded fork-safe models in {time.perf_counter() - start:.2f} seconds")
+
+    # Move everything allocated so far out of the GC's reach, so collections in
+    # the workers do not write to (and un-share) the preloaded pages.
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    Master(app, sock, args.workers, args.log_level, args.memory_report_interval).run()
+
+
+if __name__ == "__main__":
+    main()
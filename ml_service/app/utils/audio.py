@@ -1,9 +1,11 @@
 
+import threading
 from collections import OrderedDict
-from sentence_transformers import SentenceTransformer, util
 
+import numpy as np
+
+from .keyword_matcher import KeywordMatcher, normalize_phrase
 
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
 
 # Initial unordered feature labels (prioritizing more distinct features first)
 raw_feature_labels = OrderedDict({
@@ -105,66 +107,192 @@ FEATURE_NAMES = { # Simplified for clarity, map name to canonical key
 # Use your original detailed keywords for semantic matching *if* it's not a navigation command
 FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH = deduped_feature_labels # Use the deduplicated dict from your code
 
+# --- Compiled keyword matchers ---
+def build_label_matcher(feature_keywords):
+    """Matcher over every keyword of a label table; priority is the label's position."""
+    return KeywordMatcher(
+        (keyword, label, priority)
+        for priority, (label, keywords) in enumerate(feature_keywords.items())
+        for keyword in keywords
+    )
+
+
+def build_navigation_matcher():
+    """One matcher for navigation triggers and feature aliases, so both are found in a single pass."""
+    patterns = [(trigger, None, -1) for trigger in NAVIGATION_TRIGGERS]
+    patterns += [
+        (alias, feature_key, priority)
+        for priority, (feature_key, aliases) in enumerate(FEATURE_NAMES.items())
+        for alias in aliases
+    ]
+    return KeywordMatcher(patterns)
+
+
+_label_matchers = {}
+_label_matchers_lock = threading.Lock()
+
+
+def get_label_matcher(feature_keywords):
+    """Return the matcher for a label table, rebuilding it if the table changed."""
+    signature = keyword_table_signature(feature_keywords)
+    with _label_matchers_lock:
+        cached = _label_matchers.get(id(feature_keywords))
+        if cached is None or cached[0] != signature:
+            cached = _label_matchers[id(feature_keywords)] = (signature, build_label_matcher(feature_keywords))
+        return cached[1]
+
+
+NAVIGATION_MATCHER = build_navigation_matcher()
+
+
+def match_feature_keyword(text, feature_keywords=FEATURE_LABELS):
+    """Label of the longest whole-word keyword in `text` (earlier labels win ties), or None."""
+    match = get_label_matcher(feature_keywords).best(text)
+    return match.payload if match else None
+
+
 # --- Helper function to find navigation intent ---
 def find_navigation_intent(text):
-    text_lower = text.lower()
-    for trigger in NAVIGATION_TRIGGERS:
-        trigger_pattern = trigger.lower() + r"\s+" # Trigger followed by space
-        if text_lower.startswith(trigger_pattern):
-            # Extract what comes after the trigger
-            potential_feature_phrase = text_lower[len(trigger_pattern):].strip()
-            # Check if the rest matches a feature name/alias
-            for feature_key, aliases in FEATURE_NAMES.items():
-                for alias in aliases:
-                    # Use simple startswith or exact match for the feature part
-                    # Or consider fuzzy matching if needed
-                    if potential_feature_phrase.startswith(alias.lower()):
-                         # Found a navigation command!
-                        return {
-                            "intent": "navigate",
-                            "target_feature": feature_key,
-                            "confidence": 0.95 # High confidence for explicit match
-                        }
-            # If trigger matched but no known feature followed, maybe it's ambiguous
-            # Or maybe it's a generic command like "start listening" (which might be 'Play' or 'Music')
-            # For now, we'll assume if no feature matches after trigger, it's not navigation
-            pass # Continue checking other triggers
+    text_lower = normalize_phrase(text)
+    matches = NAVIGATION_MATCHER.find_all(text_lower)
+
+    # "<trigger> <feature alias> ...", e.g. "switch to currency please"
+    triggers = [match for match in matches if match.payload is None and match.start == 0]
+    for trigger in sorted(triggers, key=lambda match: match.start - match.end):
+        feature_start = trigger.end + 1  # normalized text has exactly one space between words
+        feature = KeywordMatcher.pick_best([
+            match for match in matches if match.payload is not None and match.start == feature_start
+        ])
+        if feature:
+            return {
+                "intent": "navigate",
+                "target_feature": feature.payload,
+                "confidence": 0.95 # High confidence for explicit match
+            }
 
     # Special case for commands that are just the feature name (less ideal but common)
     # This is lower confidence than explicit triggers
-    for feature_key, aliases in FEATURE_NAMES.items():
-        for alias in aliases:
-            if text_lower == alias.lower():
-                 return {
-                    "intent": "navigate",
-                    "target_feature": feature_key,
-                    "confidence": 0.75 # Lower confidence for implicit navigation
-                }
+    feature = KeywordMatcher.pick_best([
+        match for match in matches if match.payload is not None and match.start == 0 and match.end == len(text_lower)
+    ])
+    if feature:
+        return {
+            "intent": "navigate",
+            "target_feature": feature.payload,
+            "confidence": 0.75 # Lower confidence for implicit navigation
+        }
 
     return None # No clear navigation intent found
 
+# --- Precomputed keyword embeddings for semantic routing ---
+class KeywordEmbeddingIndex:
+    """All keyword embeddings of a label table as one normalized float32 matrix.
+
+    Keywords are stored grouped by label, so per-label max/mean scores are a single
+    matrix-vector product followed by a segmented reduction.
+    """
+
+    def __init__(self, embedder, feature_keywords):
+        self.signature = keyword_table_signature(feature_keywords)
+        self.labels = [label for label, keywords in feature_keywords.items() if keywords]
+
+        phrases, label_index = [], []
+        for i, label in enumerate(self.labels):
+            phrases.extend(feature_keywords[label])
+            label_index.extend([i] * len(feature_keywords[label]))
+
+        self.phrases = phrases
+        self.label_index = np.asarray(label_index, dtype=np.int32)
+        self.matrix = np.ascontiguousarray(embedder.encode(phrases), dtype=np.float32)
+        self.counts = np.bincount(self.label_index, minlength=len(self.labels))
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+
+    def label_scores(self, query_embedding, reduce="max"):
+        """Cosine score of every label: best single keyword ("max") or keyword average ("mean")."""
+        scores = self.matrix @ np.asarray(query_embedding, dtype=np.float32)
+        if reduce == "max":
+            return np.maximum.reduceat(scores, self.offsets)
+        return np.add.reduceat(scores, self.offsets) / self.counts
+
+    def best_label(self, query_embedding, reduce="max"):
+        scores = self.label_scores(query_embedding, reduce)
+        best = int(np.argmax(scores))
+        return self.labels[best], float(scores[best])
+
+
+def keyword_table_signature(feature_keywords):
+    return hash(tuple((label, tuple(keywords)) for label, keywords in feature_keywords.items()))
+
+
+_keyword_indexes = {}
+_keyword_indexes_lock = threading.Lock()
+
+
+def get_keyword_index(embedder, feature_keywords):
+    """Return the index for a label table, rebuilding it if the table changed."""
+    signature = keyword_table_signature(feature_keywords)
+    with _keyword_indexes_lock:
+        index = _keyword_indexes.get(id(feature_keywords))
+        if index is None or index.signature != signature:
+            index = _keyword_indexes[id(feature_keywords)] = KeywordEmbeddingIndex(embedder, feature_keywords)
+        return index
+
+
+def encode_query(embedder, text):
+    # `embedder` is the shared EmbeddingService: normalized float32, cached per text.
+    return embedder.encode(text)
+
+
+def route_transcript_semantically(transcript_text, embedder, feature_keywords=FEATURE_LABELS):
+    """Best label by the single closest keyword; the `/transcribe_audio` fallback."""
+    index = get_keyword_index(embedder, feature_keywords)
+    return index.best_label(encode_query(embedder, transcript_text), reduce="max")
+
+
+def route_transcript_by_keyword(transcript_text, current_feature):
+    """Step 1 of `/transcribe_audio`: route on an exact keyword, or None if there is none."""
+    transcript_text = transcript_text.lower()
+    label = match_feature_keyword(transcript_text)
+    if label is None:
+        return None
+
+    if label == current_feature:
+        return {
+            "command": current_feature,
+            "intent": "read" if "read" in transcript_text else "query",
+            "confidence": 0.9,  # high confidence
+            "query": transcript_text
+        }
+
+    return {
+        "command": label,
+        "intent": "navigate",
+        "confidence": 1.0,  # exact match = high confidence
+        "query": transcript_text
+    }
+
+
+def route_transcript(transcript_text, current_feature, embedder):
+    """Route a `/transcribe_audio` transcript: exact keyword first, semantic similarity as fallback."""
+    result = route_transcript_by_keyword(transcript_text, current_feature)
+    if result is not None:
+        return result
+
+    transcript_text = transcript_text.lower()
+    best_match, best_score = route_transcript_semantically(transcript_text, embedder)
+    return {
+        "command": best_match,
+        "intent": "navigate",
+        "confidence": round(best_score, 3),
+        "query": transcript_text
+    }
+
+
 # --- Helper function for Semantic Query Routing ---
 def route_query_semantically(query_text, embedder, feature_keywords):
-    query_embed = embedder.encode(query_text, convert_to_tensor=True)
-    best_match_feature, best_score = None, -1
-
-    # Match against the *keywords* associated with each feature
-    for feature_key, keywords in feature_keywords.items():
-        # Maybe average embeddings of keywords, or check against each?
-        # Checking against each is simpler for now
-        feature_avg_score = 0
-        if not keywords: continue # Skip features with no keywords
-
-        for keyword in keywords:
-            keyword_embed = embedder.encode(keyword, convert_to_tensor=True)
-            score = util.cos_sim(query_embed, keyword_embed).item()
-            feature_avg_score += score
-            # Optional: Keep track of the best *single* keyword match score too
-
-        feature_avg_score /= len(keywords) # Average score for the feature
-
-        if feature_avg_score > best_score:
-            best_match_feature, best_score = feature_key, feature_avg_score
+    # Match against the *keywords* associated with each feature, averaged per feature
+    index = get_keyword_index(embedder, feature_keywords)
+    best_match_feature, best_score = index.best_label(encode_query(embedder, query_text), reduce="mean")
 
     print(f"Best match feature: {best_match_feature}, Score: {best_score}")
     # Add a threshold - don't route if confidence is too low
@@ -1,10 +1,175 @@
 
 from ..config import config
 import os
+import shutil
+import subprocess
+import threading
+import time
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 import tempfile
 from typing import Dict, Any
 
+from .metrics import stage
+
+DEEPGRAM_LISTEN_URL = "https://api.deepgram.com/v1/listen?model=enhanced-phonecall"
+CONTENT_TYPES = {".wav": "audio/wav", ".mp3": "audio/mpeg", ".webm": "audio/webm"}
+
+# ---------------------------
+# Silence trimming and compaction
+# ---------------------------
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+SPEECH_PADDING_MS = 200     # kept around every speech region
+MAX_SILENCE_GAP_MS = 300    # longer pauses inside the utterance are shortened to this
+# A frame is speech if it is this loud (dBFS) and well above the recording's noise floor.
+ENERGY_THRESHOLD_DB = float(os.getenv("STT_VAD_THRESHOLD_DB", "-45"))
+NOISE_MARGIN_DB = 10
+OPUS_BITRATE = os.getenv("STT_OPUS_BITRATE", "24k")
+PREPROCESS_ENABLED = os.getenv("STT_PREPROCESS", "1") != "0"
+
+FFMPEG = shutil.which("ffmpeg")
+
+
+def decode_audio(audio_file_path) -> np.ndarray:
+    """Decode any ffmpeg-readable file to 16 kHz mono int16 samples."""
+    result = subprocess.run(
+        [FFMPEG, "-nostdin", "-loglevel", "error", "-i", audio_file_path,
+         "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-"],
+        capture_output=True, check=True,
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def encode_opus(samples: np.ndarray) -> bytes:
+    """Encode 16 kHz mono int16 samples as Opus in an Ogg container."""
+    result = subprocess.run(
+        [FFMPEG, "-nostdin", "-loglevel", "error", "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "-",
+         "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip", "-f", "ogg", "-"],
+        input=samples.tobytes(), capture_output=True, check=True,
+    )
+    return result.stdout
+
+
+def speech_frames(samples: np.ndarray) -> np.ndarray:
+    """Boolean mask over FRAME_MS frames, True where the frame's energy marks it as speech."""
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    frames = samples[:len(samples) // frame * frame].reshape(-1, frame).astype(np.float32) / 32768
+    if not len(frames):
+        return np.zeros(0, dtype=bool)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    noise_floor = np.percentile(energy_db, 10)
+    # Capped below the peak, so a recording that is speech throughout is not all dropped.
+    relative = min(noise_floor + NOISE_MARGIN_DB, energy_db.max() - NOISE_MARGIN_DB)
+    return energy_db > max(ENERGY_THRESHOLD_DB, relative)
+
+
+def compact_speech(samples: np.ndarray) -> np.ndarray:
+    """Drop leading/trailing silence and shorten long pauses; empty if there is no speech."""
+    frame = SAMPLE_RATE * FRAME_MS // 1000
+    speech = speech_frames(samples)
+    if not speech.any():
+        return samples[:0]
+
+    # Keep some context around speech so word onsets and endings are not clipped.
+    padding = SPEECH_PADDING_MS // FRAME_MS
+    keep = np.convolve(speech, np.ones(2 * padding + 1), mode="same") > 0
+
+    # Inside the utterance, keep at most MAX_SILENCE_GAP_MS of every pause.
+    first, last = np.flatnonzero(keep)[[0, -1]]
+    gap = MAX_SILENCE_GAP_MS // FRAME_MS
+    run = 0
+    for i in range(first, last + 1):
+        if keep[i]:
+            run = 0
+        else:
+            run += 1
+            keep[i] = run <= gap
+
+    frames = samples[:len(speech) * frame].reshape(-1, frame)
+    return frames[keep].ravel()
+
+
+def prepare_audio(audio_file_path):
+    """Return (payload bytes, content type, original size) ready for upload.
+
+    The payload is None when the recording contains no speech. Without ffmpeg,
+    or if decoding fails, the original file is uploaded unchanged.
+    """
+    with open(audio_file_path, "rb") as f:
+        original = f.read()
+    content_type = CONTENT_TYPES.get(os.path.splitext(audio_file_path)[1], "audio/webm")
+    if not (PREPROCESS_ENABLED and FFMPEG):
+        return original, content_type, len(original)
+
+    try:
+        with stage("audio_preprocess"):
+            speech = compact_speech(decode_audio(audio_file_path))
+            if not len(speech):
+                return None, content_type, len(original)
+            compact = encode_opus(speech)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print("⚠️ Audio preprocessing failed, uploading original:", e)
+        return original, content_type, len(original)
+
+    if len(compact) >= len(original):
+        return original, content_type, len(original)
+    return compact, "audio/ogg", len(original)
+
+
+# ---------------------------
+# Upload
+# ---------------------------
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """One keep-alive session per process, so uploads reuse the TLS connection."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers["Authorization"] = f"Token {config.DEEPGRAM_API_KEY}"
+            _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=16))
+        return _session
+
+
+class TranscriptionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.no_speech = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.upload_seconds = 0.0
+
+    def record(self, bytes_in: int, bytes_out: int, upload_seconds: float):
+        with self._lock:
+            self.requests += 1
+            self.no_speech += bytes_out == 0
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.upload_seconds += upload_seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "no_speech": self.no_speech,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "avg_transcription_seconds": round(self.upload_seconds / uploads, 3) if (uploads := self.requests - self.no_speech) else 0.0,
+            }
+
+
+transcription_stats = TranscriptionStats()
+
+
 def transcribe_audio(audio_file_path):
 
     try:
@@ -18,18 +183,24 @@ def transcribe_audio(audio_file_path):
             print("❌ Invalid audio file format:", audio_file_path)
             return {"error": "Invalid audio file format."}
 
-        # Send audio file to Deepgram
-        headers = {
-            "Authorization": f"Token {config.DEEPGRAM_API_KEY}",
-            "Content-Type": "audio/webm"
-        }
+        payload, content_type, original_bytes = prepare_audio(audio_file_path)
+        if payload is None:
+            transcription_stats.record(original_bytes, 0, 0.0)
+            print(f"🔇 No speech in {original_bytes} bytes of audio, skipped upload")
+            return {"error": "No transcript detected."}
 
-        with open(audio_file_path, "rb") as f:
-            response = requests.post(
-                "https://api.deepgram.com/v1/listen?model=enhanced-phonecall",
-                headers=headers,
-                data=f
+        # Send audio to Deepgram
+        start = time.perf_counter()
+        with stage("stt_upload"):
+            response = get_session().post(
+                DEEPGRAM_LISTEN_URL,
+                headers={"Content-Type": content_type},
+                data=payload
             )
+        elapsed = time.perf_counter() - start
+        transcription_stats.record(original_bytes, len(payload), elapsed)
+        print(f"🎙️ Uploaded {len(payload)} of {original_bytes} bytes "
+              f"({original_bytes - len(payload)} saved), transcribed in {elapsed:.2f} s")
 
         if response.status_code != 200:
             print("❌ Deepgram error:", response.text)
@@ -41,12 +212,14 @@ def transcribe_audio(audio_file_path):
 
         if not transcript:
             return {"error": "No transcript detected."}
-        
-        return {"transcript": transcript}
+
+        return {
+            "transcript": transcript,
+            "audio_bytes": original_bytes,
+            "uploaded_bytes": len(payload),
+            "transcription_seconds": round(elapsed, 3),
+        }
 
     except Exception as e:
         print("❌ Exception:", str(e))
         return {"error": "An error occurred during transcription."}
-
-        
-
@@ -0,0 +1,230 @@
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Union
+
+import numpy as np
+
+# ---------------------------
+# Shared sentence-embedding service
+# ---------------------------
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# "sentence_transformers" (PyTorch) or "onnx" (int8 export from scripts/export_minilm_onnx.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence_transformers")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join("models", "minilm-onnx-int8"))
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+# all-MiniLM-L6-v2 is trained and served by sentence-transformers with 256 tokens.
+EMBEDDING_MAX_SEQ_LENGTH = 256
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+
+
+class SentenceTransformerBackend:
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True, batch_size=len(texts))
+
+
+class OnnxMiniLMBackend:
+    """MiniLM exported to ONNX (optionally int8-quantized), run with onnxruntime on CPU.
+
+    Tokenization uses the exported `tokenizer.json`; padding, mean pooling and
+    normalization are NumPy, so PyTorch is not needed at serving time.
+    """
+
+    def __init__(self, model_dir: str = EMBEDDING_ONNX_DIR, threads: int = EMBEDDING_ONNX_THREADS):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length=EMBEDDING_MAX_SEQ_LENGTH)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(encoding.ids) for encoding in encodings)
+        input_ids = np.zeros((len(texts), length), dtype=np.int64)
+        attention_mask = np.zeros((len(texts), length), dtype=np.int64)
+        for i, encoding in enumerate(encodings):
+            input_ids[i, :len(encoding.ids)] = encoding.ids
+            attention_mask[i, :len(encoding.ids)] = encoding.attention_mask
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalization (as sentence-transformers does).
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+EMBEDDING_BACKENDS = {
+    "sentence_transformers": lambda model_name: SentenceTransformerBackend(model_name),
+    "onnx": lambda model_name: OnnxMiniLMBackend(),
+}
+
+
+class EmbeddingService:
+    """One embedding model per process behind a micro-batching queue and an LRU cache.
+
+    `encode` is thread-safe. Texts missing from the cache are queued; a single
+    worker thread merges whatever arrives within `max_wait_ms` (up to
+    `max_batch_size` texts) into one forward pass. Vectors are L2-normalized
+    float32, so a dot product is the cosine similarity.
+    """
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, backend_name: str = EMBEDDING_BACKEND,
+                 max_batch_size: int = EMBEDDING_MAX_BATCH, max_wait_ms: float = EMBEDDING_MAX_WAIT_MS,
+                 cache_size: int = EMBEDDING_CACHE_SIZE):
+        if backend_name not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend_name!r}, expected one of {sorted(EMBEDDING_BACKENDS)}")
+        self.model_name = model_name
+        self.backend_name = backend_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self.backend = None
+        self._load_lock = threading.Lock()
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._reset_worker()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.batches = 0
+        self.batched_texts = 0
+        # The worker thread does not survive fork; start a fresh one in children.
+        os.register_at_fork(after_in_child=self._reset_worker)
+
+    def _reset_worker(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def load(self):
+        with self._load_lock:
+            if self.backend is None:
+                self.backend = EMBEDDING_BACKENDS[self.backend_name](self.model_name)
+        return self
+
+    @property
+    def fork_safe(self) -> bool:
+        # PyTorch weights can be shared copy-on-write; ONNX Runtime sessions must be created per worker.
+        return self.backend_name == "sentence_transformers"
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            requests = [self._queue.get()]
+            pending = len(requests[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while pending < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                pending += len(request[0])
+
+            texts = list(dict.fromkeys(text for request_texts, _ in requests for text in request_texts))
+            try:
+                # A single large request (e.g. an offline batch) is still encoded in bounded chunks.
+                vectors = np.concatenate([
+                    np.asarray(self.backend.encode(texts[i:i + self.max_batch_size]), dtype=np.float32)
+                    for i in range(0, len(texts), self.max_batch_size)
+                ])
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.batched_texts += len(texts)
+            by_text = dict(zip(texts, vectors))
+            for request_texts, future in requests:
+                future.set_result([by_text[text] for text in request_texts])
+
+    def _cache_put(self, text: str, vector: np.ndarray):
+        with self._cache_lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def encode(self, texts: Union[str, list[str]], **kwargs) -> np.ndarray:
+        """Embed one text (returns a vector) or a list of texts (returns a matrix).
+
+        Extra keyword arguments are accepted for SentenceTransformer.encode
+        compatibility; output is always normalized numpy.
+        """
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if self.backend is None:
+            self.load()
+
+        vectors: list = [None] * len(texts)
+        missing = []
+        with self._cache_lock:
+            for i, text in enumerate(texts):
+                vectors[i] = self._cache.get(text)
+                if vectors[i] is None:
+                    missing.append(i)
+                else:
+                    self._cache.move_to_end(text)
+            self.cache_hits += len(texts) - len(missing)
+            self.cache_misses += len(missing)
+
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            future = Future()
+            self._ensure_worker()
+            self._queue.put((missing_texts, future))
+            for i, text, vector in zip(missing, missing_texts, future.result()):
+                vectors[i] = vector
+                self._cache_put(text, vector)
+
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.stack(vectors)
+        return matrix[0] if single else matrix
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "backend": self.backend_name,
+            "loaded": self.backend is not None,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "batches": self.batches,
+            "avg_batch_size": round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+embedding_service = EmbeddingService()
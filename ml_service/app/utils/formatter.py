@@ -9,6 +9,7 @@ from fpdf import FPDF
 import asyncio
 from ..config import config
 from gtts import gTTS
+from .metrics import stage, timed_stage
 
 def segment_text_by_sentence(text):
     sentence_boundaries = re.finditer(r'(?<=[.!?])\s+', text)
@@ -23,6 +24,16 @@ def segment_text_by_sentence(text):
 
     return segments
 
+def split_complete_sentences(buffer):
+    """Split streamed text into the sentences that are already complete and the unfinished rest."""
+    boundaries = list(re.finditer(r'(?<=[.!?])\s+', buffer))
+    if not boundaries:
+        return [], buffer
+
+    last = boundaries[-1]
+    sentences = segment_text_by_sentence(buffer[:last.start()])
+    return [sentence for sentence in sentences if sentence], buffer[last.end():]
+
 def create_pdf(text: str, output_path: str):
     pdf = FPDF()
     pdf.add_page()
@@ -35,6 +46,7 @@ def create_pdf(text: str, output_path: str):
 async def create_pdf_async(text: str, pdf_path: str):
     await asyncio.to_thread(create_pdf, text, pdf_path)
     
+@timed_stage("llm_format")
 def format_response_distance_estimate_with_openai(response, transcribe, base64_image):
     try:
         if response is None or len(response) == 0:
@@ -106,6 +118,7 @@ def format_response_distance_estimate_with_openai(response, transcribe, base64_i
         logging.error(f"Unexpected error in distance estimation: {e}")
         return str(response)
     
+@timed_stage("llm_format")
 def format_response_product_recognition_with_openai(response):
     try:
         if not config.OPENAI_API_KEY:
@@ -200,8 +213,9 @@ def format_audio_response(response, task):
     try:
         # Generate voice output using gTTS
         audio_file = NamedTemporaryFile(delete=False, suffix=".mp3")
-        tts = gTTS(full_text, lang="en")
-        tts.save(audio_file.name)
+        with stage("tts"):
+            tts = gTTS(full_text, lang="en")
+            tts.save(audio_file.name)
 
         return audio_file.name
     except Exception as e:
@@ -209,6 +223,7 @@ def format_audio_response(response, task):
         return None
 
 
+@timed_stage("tts")
 def format_article_audio_response(response):
     try:
         # Generate voice output using gTTS
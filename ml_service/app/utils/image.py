@@ -0,0 +1,76 @@
+import base64
+import io
+import logging
+import os
+import threading
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+# ---------------------------
+# In-memory image normalization
+# ---------------------------
+
+# Longest side, in pixels, that each task sends upstream. Text and barcodes need
+# more detail than a one-sentence caption.
+TASK_MAX_SIDE = {
+    "text_recognition": 2048,
+    "product_recognition": 1600,
+    "currency_detection": 1280,
+    "image_captioning": 768,
+    "distance_estimation": 1024,
+}
+DEFAULT_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))
+JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+EXIF_ORIENTATION_TAG = 0x0112
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _record(task: str, bytes_in: int, bytes_out: int):
+    with _stats_lock:
+        stats = _stats.setdefault(task, {"images": 0, "bytes_in": 0, "bytes_out": 0})
+        stats["images"] += 1
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+
+
+def image_stats() -> dict:
+    with _stats_lock:
+        return {task: dict(stats) for task, stats in _stats.items()}
+
+
+def normalize_image(image_bytes: bytes, task: Optional[str] = None, max_side: Optional[int] = None, quality: int = JPEG_QUALITY) -> bytes:
+    """Fix EXIF orientation, downscale to the task's max side and re-encode as JPEG.
+
+    Everything happens in memory. Images that are already upright JPEGs within the
+    size limit are returned untouched to avoid a second round of compression loss.
+    """
+    max_side = max_side or TASK_MAX_SIDE.get(task, DEFAULT_MAX_SIDE)
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+        if img.format == "JPEG" and orientation == 1 and max(img.size) <= max_side:
+            _record(task or "default", len(image_bytes), len(image_bytes))
+            return image_bytes
+
+        # Let the JPEG decoder skip detail we would throw away anyway.
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        output = io.BytesIO()
+        img.save(output, format="JPEG", quality=quality)
+        normalized = output.getvalue()
+
+    _record(task or "default", len(image_bytes), len(normalized))
+    logging.debug(f"Normalized image for {task}: {len(image_bytes)} -> {len(normalized)} bytes")
+    return normalized
+
+
+def encode_image_base64(image_bytes: bytes, task: Optional[str] = None, max_side: Optional[int] = None, quality: int = JPEG_QUALITY) -> str:
+    return base64.b64encode(normalize_image(image_bytes, task, max_side, quality)).decode("utf-8")
@@ -0,0 +1,104 @@
+from collections import deque
+from typing import Any, Iterable, NamedTuple, Optional
+
+# ---------------------------
+# Aho-Corasick multi-phrase matcher
+# ---------------------------
+
+
+class KeywordMatch(NamedTuple):
+    start: int
+    end: int
+    phrase: str
+    payload: Any
+    priority: Any
+
+
+def normalize_phrase(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class KeywordMatcher:
+    """Finds every occurrence of a set of phrases in one linear pass over the text.
+
+    Matching is case-insensitive and only accepts whole words: a phrase must not
+    start or end inside a word ("end" does not match "friend"). Each phrase carries
+    a payload and a priority; `best` prefers the longest match, then the lowest
+    priority. Build time and memory grow with the total phrase length, lookups
+    with the text length, so the vocabulary can grow to thousands of phrases in
+    any language.
+    """
+
+    def __init__(self, patterns: Iterable[tuple[str, Any, Any]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._outputs: list[list[int]] = [[]]
+        self._patterns: list[tuple[str, Any, Any]] = []
+
+        for phrase, payload, priority in patterns:
+            phrase = normalize_phrase(phrase)
+            if not phrase:
+                continue
+            self._add(phrase, len(self._patterns))
+            self._patterns.append((phrase, payload, priority))
+
+        self._build_failure_links()
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def _add(self, phrase: str, pattern_id: int):
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+        self._outputs[state].append(pattern_id)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                # Every phrase that ends at the fallback state also ends here.
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def find_all(self, text: str) -> list[KeywordMatch]:
+        """All whole-word matches in `text`; offsets refer to `normalize_phrase(text)`."""
+        text = normalize_phrase(text)
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+
+            for pattern_id in self._outputs[state]:
+                phrase, payload, priority = self._patterns[pattern_id]
+                start, end = i + 1 - len(phrase), i + 1
+                if _is_word_boundary(text, start, end):
+                    matches.append(KeywordMatch(start, end, phrase, payload, priority))
+        return matches
+
+    @staticmethod
+    def pick_best(matches: list[KeywordMatch]) -> Optional[KeywordMatch]:
+        if not matches:
+            return None
+        return min(matches, key=lambda match: (match.start - match.end, match.priority, match.start))
+
+    def best(self, text: str) -> Optional[KeywordMatch]:
+        return self.pick_best(self.find_all(text))
+
+
+def _is_word_boundary(text: str, start: int, end: int) -> bool:
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+import logging
+from typing import Optional
+
+import httpx
+import openai
+from dotenv import load_dotenv
+
+# LangChain Models
+from langchain_community.chat_models import ChatOpenAI
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_groq import ChatGroq
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Process-wide LLM client registry
+# ---------------------------
+
+# Base URLs used to prime the keep-alive pools at startup.
+PROVIDER_BASE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "groq": "https://api.groq.com/openai/v1",
+}
+
+# Shared connection limits for every HTTP pool owned by the registry.
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "120")),
+)
+POOL_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+# Clients built at startup so the first request does not pay for construction.
+# Every provider the hedged router can fall back to is warmed, so the first
+# hedge does not also pay for a cold client and TLS handshake.
+DEFAULT_WARM_UP = [
+    ("gemini", "gemini-2.0-flash-exp", 0.2),
+    ("openai", "gpt-4o-mini", 0.2),
+    ("groq", "llama3-8b-8192", None),
+]
+# Providers without their key configured are skipped by the default warm-up.
+PROVIDER_API_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "gemini": "GOOGLE_API_KEY",
+    "groq": "GROQ_API_KEY",
+}
+
+
+class _RegistryEntry:
+    def __init__(self, client):
+        self.client = client
+        self.created_at = time.time()
+        self.uses = 0
+
+
+class LLMClientRegistry:
+    """Long-lived, thread-safe chat model clients keyed by (provider, model, temperature).
+
+    Each provider gets one sync and one async HTTP pool that are shared by every
+    model built for it, so TLS sessions stay open across requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[tuple, _RegistryEntry] = {}
+        self._http_pools: dict[str, tuple[httpx.Client, httpx.AsyncClient]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get_http_pools(self, provider: str):
+        pools = self._http_pools.get(provider)
+        if pools is None:
+            pools = (
+                httpx.Client(limits=POOL_LIMITS, timeout=POOL_TIMEOUT),
+                httpx.AsyncClient(limits=POOL_LIMITS, timeout=POOL_TIMEOUT),
+            )
+            self._http_pools[provider] = pools
+        return pools
+
+    def _build(self, provider: str, model: str, temperature: Optional[float]):
+        if provider == "openai":
+            http_client, http_async_client = self._get_http_pools(provider)
+            api_key = os.getenv("OPENAI_API_KEY")
+            return ChatOpenAI(
+                model=model,
+                temperature=temperature,
+                client=openai.OpenAI(api_key=api_key, http_client=http_client).chat.completions,
+                async_client=openai.AsyncOpenAI(api_key=api_key, http_client=http_async_client).chat.completions,
+            )
+        elif provider == "gemini":
+            # The Gemini client keeps its own gRPC channel open for the lifetime of the instance.
+            return ChatGoogleGenerativeAI(model=model, temperature=temperature, google_api_key=os.getenv("GOOGLE_API_KEY"))
+        elif provider == "groq":
+            http_client, http_async_client = self._get_http_pools(provider)
+            kwargs = {} if temperature is None else {"temperature": temperature}
+            return ChatGroq(
+                model=model,
+                groq_api_key=os.getenv("GROQ_API_KEY"),
+                http_client=http_client,
+                http_async_client=http_async_client,
+                **kwargs,
+            )
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+
+    def get(self, provider: str, model: str, temperature: Optional[float] = None):
+        key = (provider, model, temperature)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                entry = self._entries[key] = _RegistryEntry(self._build(provider, model, temperature))
+            else:
+                self.hits += 1
+            entry.uses += 1
+            return entry.client
+
+    async def warm_up(self, specs=None):
+        """Build the given clients and open one keep-alive connection per provider pool.
+
+        Without `specs`, every provider in DEFAULT_WARM_UP that has credentials is warmed.
+        """
+        if specs is None:
+            specs = [spec for spec in DEFAULT_WARM_UP if os.getenv(PROVIDER_API_KEYS[spec[0]])]
+        for provider, model, temperature in specs:
+            try:
+                self.get(provider, model, temperature)
+            except Exception as e:
+                logger.warning(f"Failed to warm up {provider}/{model}: {e}")
+
+        for provider, (_, http_async_client) in list(self._http_pools.items()):
+            try:
+                # Any response, even 401, leaves an open TLS connection in the pool.
+                await http_async_client.get(f"{PROVIDER_BASE_URLS[provider]}/models")
+            except Exception as e:
+                logger.warning(f"Failed to prime connection pool for {provider}: {e}")
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._lock:
+            clients = [
+                {
+                    "provider": provider,
+                    "model": model,
+                    "temperature": temperature,
+                    "uses": entry.uses,
+                    "age_seconds": round(now - entry.created_at, 1),
+                }
+                for (provider, model, temperature), entry in self._entries.items()
+            ]
+            pools = {
+                provider: {
+                    "sync": _describe_pool(http_client),
+                    "async": _describe_pool(http_async_client),
+                }
+                for provider, (http_client, http_async_client) in self._http_pools.items()
+            }
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "clients": clients,
+                "pools": pools,
+                "limits": {
+                    "max_connections": POOL_LIMITS.max_connections,
+                    "max_keepalive_connections": POOL_LIMITS.max_keepalive_connections,
+                    "keepalive_expiry": POOL_LIMITS.keepalive_expiry,
+                },
+            }
+
+    async def aclose(self):
+        with self._lock:
+            pools = list(self._http_pools.values())
+            self._http_pools.clear()
+            self._entries.clear()
+        for http_client, http_async_client in pools:
+            http_client.close()
+            await http_async_client.aclose()
+
+
+def _describe_pool(client) -> dict:
+    """Connection counts of an httpx client; httpx has no public API for this."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+    return {
+        "connections": len(connections),
+        "idle": sum(1 for connection in connections if connection.is_idle()),
+    }
+
+
+llm_registry = LLMClientRegistry()
+
+
+def get_chat_model(provider: str, model: str, temperature: Optional[float] = None):
+    return llm_registry.get(provider, model, temperature)
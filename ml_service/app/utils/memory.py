@@ -0,0 +1,47 @@
+import os
+
+# ---------------------------
+# Per-process memory accounting (Linux)
+# ---------------------------
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def process_memory(pid: int = None) -> dict:
+    """RSS, PSS and USS of a process in bytes, from /proc/<pid>/smaps_rollup.
+
+    USS (private clean + dirty) is what the process would free on exit; summed
+    over workers it shows how much memory copy-on-write sharing actually saves.
+    """
+    pid = pid or os.getpid()
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].rstrip(":") in SMAPS_FIELDS:
+                    values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+        "shared": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+    }
+
+
+def format_memory_report(rows) -> str:
+    """Render [(label, pid, process_memory dict), ...] as a fixed-width table in MiB."""
+    mib = 1024 * 1024
+    lines = [f"{'process':<12}{'pid':>8}{'rss':>10}{'pss':>10}{'uss':>10}{'shared':>10}  (MiB)"]
+    totals = {"rss": 0, "pss": 0, "uss": 0, "shared": 0}
+    for label, pid, memory in rows:
+        for key in totals:
+            totals[key] += memory.get(key, 0)
+        lines.append(
+            f"{label:<12}{pid:>8}" + "".join(f"{memory.get(key, 0) / mib:>10.1f}" for key in ("rss", "pss", "uss", "shared"))
+        )
+    lines.append(f"{'total':<12}{'':>8}" + "".join(f"{totals[key] / mib:>10.1f}" for key in ("rss", "pss", "uss", "shared")))
+    return "\n".join(lines)
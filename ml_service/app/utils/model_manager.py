@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Model lifecycle manager
+# ---------------------------
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+# Upper bound on how long a request waits for a model that is still loading.
+MODEL_WAIT_TIMEOUT = float(os.getenv("MODEL_WAIT_TIMEOUT", "300"))
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when a model failed to load or is not ready in time."""
+
+
+class _ModelEntry:
+    def __init__(self, name: str, loader: Callable[[], object], depends_on: tuple, fork_safe: bool):
+        self.name = name
+        self.loader = loader
+        self.depends_on = depends_on
+        self.fork_safe = fork_safe
+        self.future: Future = Future()
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+
+
+class ModelManager:
+    """Loads registered models in background threads and tracks their readiness.
+
+    Models load in parallel once `start()` is called; a model waits only for the
+    models listed in its `depends_on`. Request handlers await `wait_for(...)` with
+    just the models they need, so the app can serve other endpoints while the
+    heavy ones are still loading.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._entries: dict[str, _ModelEntry] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register(self, name: str, loader: Callable[[], object], depends_on=(), fork_safe: bool = False):
+        """Register a model loader.
+
+        `fork_safe` marks models whose loaded state is plain read-only memory (e.g.
+        torch weights) and can be loaded once in a pre-fork master and shared
+        copy-on-write. ONNX Runtime sessions, TensorFlow graphs and network
+        clients must stay False and are loaded again in every worker.
+        """
+        self._entries[name] = _ModelEntry(name, loader, tuple(depends_on), fork_safe)
+
+    def _load(self, entry: _ModelEntry):
+        with self._lock:
+            if entry.state != PENDING:
+                return
+            entry.state = LOADING
+
+        try:
+            for dependency in entry.depends_on:
+                self._entries[dependency].future.result()
+            start = time.perf_counter()
+            model = entry.loader()
+        except Exception as e:
+            entry.state = FAILED
+            entry.error = str(e)
+            logger.error(f"Failed to load model {entry.name}: {e}")
+            entry.future.set_exception(ModelUnavailableError(f"Model {entry.name} failed to load: {e}"))
+            return
+
+        entry.load_seconds = round(time.perf_counter() - start, 2)
+        entry.state = READY
+        logger.info(f"Model {entry.name} loaded in {entry.load_seconds:.2f} seconds")
+        entry.future.set_result(model)
+
+    def start(self):
+        """Start loading every registered model in the background."""
+        if self._executor is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model-loader")
+        # Dependencies are submitted first so a worker is never stuck waiting on
+        # a model that has not been scheduled yet.
+        for entry in self._ordered_entries():
+            self._executor.submit(self._load, entry)
+
+    def _ordered_entries(self):
+        ordered, seen = [], set()
+
+        def visit(entry):
+            if entry.name in seen:
+                return
+            seen.add(entry.name)
+            for dependency in entry.depends_on:
+                visit(self._entries[dependency])
+            ordered.append(entry)
+
+        for entry in self._entries.values():
+            visit(entry)
+        return ordered
+
+    def preload_fork_safe(self):
+        """Load every fork-safe model in the calling thread, before workers are forked."""
+        for entry in self._ordered_entries():
+            if entry.fork_safe:
+                self.get(entry.name)
+
+    def after_fork(self):
+        """Reset state that must not be inherited from the master process.
+
+        Threads do not survive fork, so the executor and lock are recreated and
+        every model that is not a loaded fork-safe model goes back to pending.
+        """
+        self._executor = None
+        self._lock = threading.Lock()
+        for entry in self._entries.values():
+            if entry.fork_safe and entry.state == READY:
+                continue
+            entry.future = Future()
+            entry.state = PENDING
+            entry.error = None
+            entry.load_seconds = None
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get(self, name: str):
+        """Return a model, loading it in the calling thread if nothing started it yet."""
+        entry = self._entries[name]
+        if entry.state == PENDING and self._executor is None:
+            for dependency in entry.depends_on:
+                self.get(dependency)
+            self._load(entry)
+        try:
+            return entry.future.result()
+        except ModelUnavailableError:
+            raise
+        except Exception as e:
+            raise ModelUnavailableError(str(e))
+
+    def warm(self, *names: str):
+        """Load the given models now, in the calling thread, unless loading already started.
+
+        Used to move a model that is about to be needed ahead of the background queue.
+        """
+        for name in names:
+            entry = self._entries[name]
+            if entry.state == PENDING:
+                self.warm(*entry.depends_on)
+                self._load(entry)
+
+    async def wait_for(self, *names: str, timeout: Optional[float] = MODEL_WAIT_TIMEOUT):
+        """Await the given models. Returns a single model or a tuple, in argument order.
+
+        Raises ModelUnavailableError at once for a model nothing is loading (`start()`
+        was not called), and after `timeout` seconds for one still loading.
+        """
+        idle = [name for name in names if self._entries[name].state == PENDING and self._executor is None]
+        if idle:
+            raise ModelUnavailableError(f"Models are not being loaded: {', '.join(idle)}")
+        futures = [asyncio.wrap_future(self._entries[name].future) for name in names]
+        try:
+            # Shielded: timing out must not cancel the shared load futures for other callers.
+            models = await asyncio.wait_for(asyncio.shield(asyncio.gather(*futures)), timeout)
+        except asyncio.TimeoutError:
+            raise ModelUnavailableError(f"Models not ready after {timeout} seconds: {', '.join(names)}")
+        return models[0] if len(models) == 1 else tuple(models)
+
+    def is_ready(self, *names: str) -> bool:
+        names = names or tuple(self._entries)
+        return all(self._entries[name].state == READY for name in names)
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "state": entry.state,
+                "load_seconds": entry.load_seconds,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+model_manager = ModelManager()
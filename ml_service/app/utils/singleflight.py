@@ -0,0 +1,59 @@
+import asyncio
+import hashlib
+from typing import Awaitable, Callable
+
+# ---------------------------
+# In-process request coalescing
+# ---------------------------
+
+
+def fingerprint(*parts) -> str:
+    """Content fingerprint of a call, used as the single-flight key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its result.
+
+    The work runs in its own task, so a caller that disconnects (and gets cancelled)
+    does not cancel the result the other callers are waiting on.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+
+llm_flight = SingleFlight("llm")
+pipeline_flight = SingleFlight("article_pipeline")
+
+
+def singleflight_stats() -> dict:
+    return {flight.name: flight.stats() for flight in (llm_flight, pipeline_flight)}
@@ -0,0 +1,181 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+from typing import AsyncIterator, NamedTuple
+from urllib.parse import urlencode
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------
+# Streaming speech-to-text backends
+# ---------------------------
+
+STT_BACKEND = os.getenv("STT_BACKEND", "deepgram")
+DEEPGRAM_STREAM_URL = "wss://api.deepgram.com/v1/listen"
+DEEPGRAM_STREAM_MODEL = os.getenv("DEEPGRAM_STREAM_MODEL", "enhanced-phonecall")
+# Canned transcripts for the replay backend, one per line; the defaults cover navigation and in-feature commands.
+STT_REPLAY_FILE = os.getenv("STT_REPLAY_FILE")
+DEFAULT_REPLAY_TRANSCRIPTS = [
+    "switch to currency please",
+    "how far is the door in front of me",
+    "who is this person",
+    "read the latest news article",
+]
+
+
+class TranscriptEvent(NamedTuple):
+    text: str       # transcript of the current segment
+    is_final: bool  # False for interim hypotheses that may still change
+
+
+class StreamingSession:
+    """One utterance: audio goes in with `send`, transcript events come out of `events`.
+
+    Subclasses put TranscriptEvents on `self._events` and None once the backend
+    has nothing more to say.
+    """
+
+    def __init__(self):
+        self._events: asyncio.Queue = asyncio.Queue()
+
+    async def send(self, chunk: bytes):
+        raise NotImplementedError
+
+    async def finish(self):
+        """No more audio; the backend flushes its final transcript and ends `events`."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def events(self) -> AsyncIterator[TranscriptEvent]:
+        while True:
+            event = await self._events.get()
+            if event is None:
+                return
+            yield event
+
+
+class DeepgramStreamingSession(StreamingSession):
+    def __init__(self, socket):
+        super().__init__()
+        self._socket = socket
+        self._finished = False
+        self._receiver = asyncio.create_task(self._receive())
+
+    async def _receive(self):
+        try:
+            async for message in self._socket:
+                if isinstance(message, bytes):
+                    continue
+                result = json.loads(message)
+                if result.get("type") != "Results":
+                    continue
+                alternatives = result.get("channel", {}).get("alternatives") or [{}]
+                text = alternatives[0].get("transcript", "")
+                if text or result.get("is_final"):
+                    self._events.put_nowait(TranscriptEvent(text, bool(result.get("is_final"))))
+        except Exception as e:
+            logger.warning(f"Deepgram stream ended with an error: {e}")
+        finally:
+            self._events.put_nowait(None)
+
+    async def send(self, chunk: bytes):
+        await self._socket.send(chunk)
+
+    async def finish(self):
+        if not self._finished:
+            self._finished = True
+            await self._socket.send(json.dumps({"type": "CloseStream"}))
+
+    async def close(self):
+        self._receiver.cancel()
+        await self._socket.close()
+
+
+class DeepgramStreamingBackend:
+    """Deepgram live transcription over a WebSocket, with interim results enabled."""
+
+    name = "deepgram"
+
+    def __init__(self, api_key: str = None, model: str = DEEPGRAM_STREAM_MODEL):
+        self.api_key = api_key or config.DEEPGRAM_API_KEY
+        self.model = model
+
+    async def open_session(self, options: dict = None) -> StreamingSession:
+        from websockets.asyncio.client import connect
+
+        params = {"model": self.model, "interim_results": "true", "punctuate": "true"}
+        socket = await connect(
+            f"{DEEPGRAM_STREAM_URL}?{urlencode(params)}",
+            additional_headers={"Authorization": f"Token {self.api_key}"},
+        )
+        return DeepgramStreamingSession(socket)
+
+
+class ReplaySession(StreamingSession):
+    def __init__(self, transcript: str):
+        super().__init__()
+        self._words = transcript.split()
+        self._emitted = 0
+        self._finished = False
+
+    async def send(self, chunk: bytes):
+        # Every audio chunk "recognizes" one more word, as an interim hypothesis.
+        if self._emitted < len(self._words):
+            self._emitted += 1
+            self._events.put_nowait(TranscriptEvent(" ".join(self._words[:self._emitted]), False))
+
+    async def finish(self):
+        if not self._finished:
+            self._finished = True
+            self._events.put_nowait(TranscriptEvent(" ".join(self._words), True))
+            self._events.put_nowait(None)
+
+
+class ReplayBackend:
+    """Offline stand-in that ignores the audio and replays canned transcripts.
+
+    Sessions cycle through the transcripts; a client can pick one with the
+    `replay_text` option. Interim results grow one word per received chunk.
+    """
+
+    name = "replay"
+
+    def __init__(self, transcripts=None):
+        if transcripts is None and STT_REPLAY_FILE:
+            with open(STT_REPLAY_FILE) as f:
+                transcripts = [line.strip() for line in f if line.strip()]
+        self.transcripts = list(transcripts or DEFAULT_REPLAY_TRANSCRIPTS)
+        self._next = itertools.cycle(self.transcripts)
+
+    async def open_session(self, options: dict = None) -> StreamingSession:
+        text = (options or {}).get("replay_text") or next(self._next)
+        return ReplaySession(text)
+
+
+STT_BACKENDS = {
+    "deepgram": DeepgramStreamingBackend,
+    "replay": ReplayBackend,
+}
+
+_backend = None
+
+
+def get_stt_backend():
+    global _backend
+    if _backend is None:
+        if STT_BACKEND not in STT_BACKENDS:
+            raise ValueError(f"Unknown STT backend {STT_BACKEND!r}, expected one of {sorted(STT_BACKENDS)}")
+        _backend = STT_BACKENDS[STT_BACKEND]()
+    return _backend
+
+
+def set_stt_backend(backend):
+    """Swap the backend, e.g. to a ReplayBackend in tests."""
+    global _backend
+    _backend = backend
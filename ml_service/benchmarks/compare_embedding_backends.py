@@ -0,0 +1,104 @@
+"""
+Compare the PyTorch and ONNX embedding backends on intent routing.
+
+Routes every labeled utterance with both backends (the `/transcribe_audio`
+max-score router and the `route_query_semantically` mean-score router) and
+reports accuracy against the labels, decisions that differ between backends,
+how close the two backends' vectors are, and per-utterance encode latency.
+Exits with status 1 if any routing decision changes, so it can gate a switch
+of `EMBEDDING_BACKEND`.
+
+Usage (from ml_service/, after scripts/export_minilm_onnx.py):
+    python -m benchmarks.compare_embedding_backends --backends sentence_transformers onnx
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from app.utils.audio import FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH, FEATURE_LABELS, KeywordEmbeddingIndex
+from app.utils.embedding import EmbeddingService
+
+from .routing_utterances import UTTERANCES
+
+ROUTERS = (
+    ("transcribe_audio", FEATURE_LABELS, "max"),
+    ("route_query", FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH, "mean"),
+)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def evaluate(backend_name: str, repeats: int) -> dict:
+    # No cache, no batching delay: every encode below is a real forward pass.
+    service = EmbeddingService(backend_name=backend_name, cache_size=0, max_wait_ms=0)
+    load_start = time.perf_counter()
+    service.load()
+    load_seconds = time.perf_counter() - load_start
+
+    texts = [text for text, _ in UTTERANCES]
+    service.encode(texts[:4])  # warm-up
+    latencies = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            service.encode(text)
+            latencies.append(time.perf_counter() - start)
+
+    vectors = service.encode(texts)
+    decisions = {}
+    for router, table, reduce in ROUTERS:
+        index = KeywordEmbeddingIndex(service, table)
+        decisions[router] = [index.best_label(vector, reduce)[0] for vector in vectors]
+
+    return {"load_seconds": load_seconds, "latencies": latencies, "vectors": vectors, "decisions": decisions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends on intent routing")
+    parser.add_argument("--backends", nargs="+", default=["sentence_transformers", "onnx"])
+    parser.add_argument("--repeats", type=int, default=5, help="latency passes over the utterance set")
+    parser.add_argument("--verbose", action="store_true", help="list every changed decision")
+    args = parser.parse_args()
+
+    labels = [label for _, label in UTTERANCES]
+    results = {backend: evaluate(backend, args.repeats) for backend in args.backends}
+
+    print(f"{len(UTTERANCES)} utterances, {args.repeats} latency passes\n")
+    print(f"{'backend':<24}{'load s':>8}{'p50 ms':>9}{'p99 ms':>9}" + "".join(f"{router + ' acc':>22}" for router, _, _ in ROUTERS))
+    for backend, result in results.items():
+        latencies = result["latencies"]
+        accuracies = [
+            sum(d == label for d, label in zip(result["decisions"][router], labels)) / len(labels)
+            for router, _, _ in ROUTERS
+        ]
+        print(f"{backend:<24}{result['load_seconds']:>8.2f}{statistics.median(latencies) * 1000:>9.2f}"
+              f"{percentile(latencies, 0.99) * 1000:>9.2f}" + "".join(f"{accuracy:>22.1%}" for accuracy in accuracies))
+
+    reference, *others = args.backends
+    changed = 0
+    for backend in others:
+        similarity = np.sum(results[reference]["vectors"] * results[backend]["vectors"], axis=1)
+        print(f"\n{backend} vs {reference}: cosine mean {similarity.mean():.4f}, min {similarity.min():.4f}")
+        for router, _, _ in ROUTERS:
+            diffs = [
+                (text, a, b)
+                for (text, _), a, b in zip(UTTERANCES, results[reference]["decisions"][router], results[backend]["decisions"][router])
+                if a != b
+            ]
+            changed += len(diffs)
+            print(f"  {router}: {len(diffs)} changed decisions")
+            if args.verbose:
+                for text, a, b in diffs:
+                    print(f"    {text!r}: {a} -> {b}")
+
+    sys.exit(1 if changed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Face matching latency: full-collection scan vs the FaceIndex backends.
+
+Builds a synthetic gallery of random unit-norm embeddings at each size and
+times a top-1 search. The baseline reproduces the old `find_existing_face`
+loop (list-of-floats documents turned into one array per row, one cosine
+similarity per row) without the MongoDB transfer, so the real gap is larger.
+It is skipped above `--baseline-max` faces because it takes minutes.
+Recall@1 is measured against the exact backend's answer. With `--snapshot`
+each index is also saved, reloaded with `load_snapshot` and checked to give
+the same top match for every query ("reload" column).
+
+Usage (from ml_service/):
+    python -m benchmarks.face_index --sizes 1000 100000 1000000 --dim 512
+    python -m benchmarks.face_index --backends exact ivf hnsw --sizes 1000000
+    python -m benchmarks.face_index --backends exact ivf hnsw --sizes 2000 --dim 128 --snapshot
+
+VGG-Face, DeepFace's default model, has 4096-dimensional embeddings: 1M faces
+is then 16 GiB of float32, so use `--dim 4096` only with smaller sizes.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.face_detection.ann import ANN_BACKENDS
+from app.face_detection.face_index import FaceIndex
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def scan_baseline(docs, embedding, threshold=0.5):
+    """The previous implementation, minus the database fetch."""
+    matched = []
+    for doc in docs:
+        existing = np.array(doc["embedding"])
+        sim = np.dot(embedding, existing) / (np.linalg.norm(embedding) * np.linalg.norm(existing))
+        if sim >= threshold:
+            matched.append((doc["name"], sim))
+    return max(matched, key=lambda x: x[1]) if matched else None
+
+
+def time_queries(search, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def snapshot_agreement(index, queries, found) -> float:
+    """Fraction of queries whose top match survives a save and load_snapshot round trip."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "face_index")
+        index.save(path)
+        reloaded = FaceIndex(index.backend_name)
+        if not reloaded.load_snapshot(path):
+            return 0.0
+        again = [reloaded.best(query, -1) for query in queries]
+    return sum((a and a.id) == (b and b.id) for a, b in zip(again, found)) / len(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face matching at several gallery sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--backends", nargs="+", default=["exact"], choices=sorted(ANN_BACKENDS))
+    parser.add_argument("--noise", type=float, default=0.3, help="query noise relative to the unit embedding scale")
+    parser.add_argument("--baseline-max", type=int, default=100_000, help="largest size to run the scan baseline at")
+    parser.add_argument("--snapshot", action="store_true", help="also check results after a save/load_snapshot round trip")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim}, {args.queries} queries per size\n")
+    print(f"{'faces':>10}{'backend':>9}{'build s':>9}{'MiB':>9}{'p50 ms':>9}{'p99 ms':>9}{'recall@1':>10}"
+          f"{'scan p50 ms':>13}{'speedup':>9}{'reload':>8}")
+
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim), dtype=np.float32)
+        # Queries are noisy copies of gallery faces, so every search has a true match.
+        targets = rng.integers(0, size, args.queries)
+        queries = embeddings[targets] + args.noise * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        ids, names = np.arange(size), [f"person-{i}" for i in range(size)]
+
+        exact = FaceIndex("exact")
+        exact.build(ids, names, embeddings)
+        truth = [exact.best(query, -1).id for query in queries]
+
+        scan = None
+        if size <= args.baseline_max:
+            docs = [{"name": f"person-{i}", "embedding": row.astype(np.float64).tolist()} for i, row in enumerate(embeddings)]
+            scan = statistics.median(time_queries(lambda query: scan_baseline(docs, query), queries[:5]))
+            del docs
+
+        for backend in args.backends:
+            index = exact if backend == "exact" else FaceIndex(backend)
+            start = time.perf_counter()
+            index.build(ids, names, embeddings)
+            build_seconds = time.perf_counter() - start
+
+            latencies = time_queries(index.best, queries)
+            found = [index.best(query, -1) for query in queries]
+            recall = sum(match is not None and match.id == expected for match, expected in zip(found, truth)) / len(truth)
+            reload = snapshot_agreement(index, queries, found) if args.snapshot else None
+
+            print(f"{size:>10}{backend:>9}{build_seconds:>9.2f}{index.stats()['bytes'] / 2**20:>9.1f}"
+                  f"{statistics.median(latencies) * 1000:>9.2f}{percentile(latencies, 0.99) * 1000:>9.2f}{recall:>10.3f}"
+                  f"{'-' if scan is None else f'{scan * 1000:.1f}':>13}"
+                  f"{'-' if scan is None else f'{scan / statistics.median(latencies):.0f}x':>9}"
+                  f"{'-' if reload is None else f'{reload:.3f}':>8}")
+
+if __name__ == "__main__":
+    main()
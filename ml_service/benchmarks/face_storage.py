@@ -0,0 +1,86 @@
+"""
+Face collection storage: list-of-floats documents vs binary embeddings.
+
+Fills an in-memory MongoDB stand-in (mongomock) with a synthetic gallery in
+each storage format and reports the BSON size per document, insert time,
+the time to load the face index (projected to `_id`, `name` and the
+embedding) and, for comparison, to fetch and decode full documents.
+Top-1 agreement compares matches for noisy queries against the first format
+(list and float32 are both exact), to show what float16 and int8 cost.
+
+mongomock copies documents in Python, so absolute times are slower than a
+real server, but the relative cost of decoding lists vs bytes carries over.
+
+Usage (from ml_service/, needs `pip install mongomock`):
+    python -m benchmarks.face_storage --sizes 1000 10000 --dim 4096
+"""
+import argparse
+import time
+
+import bson
+import mongomock
+import numpy as np
+
+from app.face_detection.embedding_codec import decode_embedding, encode_embedding
+from app.face_detection.face_index import FaceIndex
+
+FORMATS = ["list", "float32", "float16", "int8"]
+
+
+def make_document(i, embedding, fmt):
+    doc = {"name": f"person-{i}", "hometown": "Hà Nội", "relationship": "friend", "date_of_birth": "1990-01-01"}
+    if fmt == "list":
+        doc["embedding"] = embedding.astype(np.float64).tolist()
+    else:
+        doc.update(encode_embedding(embedding, fmt))
+    return doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face embedding storage formats")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--dim", type=int, default=4096, help="4096 for VGG-Face, 512 for Facenet512/ArcFace")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"dim={args.dim}\n")
+    print(f"{'faces':>8}{'format':>9}{'KiB/doc':>9}{'insert s':>10}{'index load s':>14}{'full fetch s':>14}{'top-1 agree':>13}")
+
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim), dtype=np.float32)
+        targets = rng.integers(0, size, args.queries)
+        queries = embeddings[targets] + 0.5 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        reference = None
+
+        for fmt in args.formats:
+            collection = mongomock.MongoClient().db.faces
+            docs = [make_document(i, row, fmt) for i, row in enumerate(embeddings)]
+            doc_bytes = len(bson.encode(docs[0]))
+
+            start = time.perf_counter()
+            collection.insert_many(docs)
+            insert_seconds = time.perf_counter() - start
+            del docs
+
+            start = time.perf_counter()
+            index = FaceIndex("exact").load(collection)
+            load_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for doc in collection.find({}):
+                decode_embedding(doc)
+            fetch_seconds = time.perf_counter() - start
+
+            found = [index.best(query, -1).name for query in queries]
+            if reference is None:
+                reference = found
+            agree = np.mean([a == b for a, b in zip(found, reference)])
+
+            print(f"{size:>8}{fmt:>9}{doc_bytes / 1024:>9.1f}{insert_seconds:>10.2f}{load_seconds:>14.2f}"
+                  f"{fetch_seconds:>14.2f}{agree:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
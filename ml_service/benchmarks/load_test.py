@@ -0,0 +1,87 @@
+"""
+Concurrent load test for the vision endpoints.
+
+Fires a burst of identical uploads at a running ml_service instance and reports
+how many requests were in flight at the same time. With a blocking handler the
+requests are served one after another and the peak overlap stays at 1; with the
+async execution path the peak should be close to the requested concurrency and
+the wall time close to a single request's latency.
+
+Usage (from ml_service/, with the server started via start.sh):
+    python -m benchmarks.load_test --image app/all_task/examples/image_captioning.png \
+        --endpoint /image_captioning --requests 32 --concurrency 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def send_request(client, url, image_bytes, filename, semaphore, timings):
+    async with semaphore:
+        start = time.perf_counter()
+        response = await client.post(url, files={"file": (filename, image_bytes, "image/jpeg")})
+        end = time.perf_counter()
+        timings.append((start, end, response.status_code))
+
+
+def peak_overlap(timings):
+    """Maximum number of requests that were in flight at the same instant."""
+    events = []
+    for start, end, _ in timings:
+        events.append((start, 1))
+        events.append((end, -1))
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    in_flight, peak = 0, 0
+    for _, delta in events:
+        in_flight += delta
+        peak = max(peak, in_flight)
+    return peak
+
+
+async def run(args):
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+
+    url = args.host.rstrip("/") + args.endpoint
+    semaphore = asyncio.Semaphore(args.concurrency)
+    timings = []
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        wall_start = time.perf_counter()
+        await asyncio.gather(*[
+            send_request(client, url, image_bytes, args.image, semaphore, timings)
+            for _ in range(args.requests)
+        ])
+        wall_time = time.perf_counter() - wall_start
+
+    latencies = sorted(end - start for start, end, _ in timings)
+    errors = sum(1 for _, _, status in timings if status != 200)
+    serial_time = sum(latencies)
+
+    print(f"Endpoint:          {url}")
+    print(f"Requests:          {len(timings)} ({errors} non-200)")
+    print(f"Wall time:         {wall_time:.2f} s")
+    print(f"Sum of latencies:  {serial_time:.2f} s")
+    print(f"Latency p50/max:   {statistics.median(latencies):.2f} s / {latencies[-1]:.2f} s")
+    print(f"Peak overlap:      {peak_overlap(timings)} requests in flight")
+    print(f"Overlap factor:    {serial_time / wall_time:.1f}x (1.0x means fully serialized)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the vision endpoints")
+    parser.add_argument("--host", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="/image_captioning")
+    parser.add_argument("--image", required=True)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+from .corpus import build_corpus
+from .routers import ROUTERS
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def evaluate(route, items, repeats: int) -> dict:
+    predictions, latencies = [], []
+    for _ in range(repeats):
+        predictions = []
+        for item in items:
+            start = time.perf_counter()
+            prediction = route(item.text, item.current_feature)
+            latencies.append(time.perf_counter() - start)
+            predictions.append(prediction)
+
+    by_category = defaultdict(lambda: [0, 0])
+    confusion = Counter()
+    intent_hits = intent_total = 0
+    for item, prediction in zip(items, predictions):
+        correct = prediction.command == item.command
+        by_category[item.category][0] += correct
+        by_category[item.category][1] += 1
+        confusion[(item.command, prediction.command)] += 1
+        if item.intent is not None and prediction.intent is not None:
+            intent_total += 1
+            intent_hits += prediction.intent == item.intent
+
+    correct = sum(hits for hits, _ in by_category.values())
+    return {
+        "accuracy": correct / len(items),
+        "intent_accuracy": intent_hits / intent_total if intent_total else None,
+        "by_category": {category: hits / total for category, (hits, total) in by_category.items()},
+        "confusion": confusion,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "throughput": len(latencies) / sum(latencies),
+        "errors": [
+            (item.text, item.current_feature, item.command, prediction.command)
+            for item, prediction in zip(items, predictions) if prediction.command != item.command
+        ],
+    }
+
+
+def format_confusion(confusion: Counter) -> str:
+    labels = sorted({label for pair in confusion for label in pair})
+    width = max(len(label) for label in labels) + 1
+    lines = ["expected/got".ljust(width) + "".join(f"{label[:7]:>8}" for label in labels)]
+    for expected in labels:
+        row = [confusion.get((expected, got), 0) for got in labels]
+        if any(row):
+            lines.append(f"{expected:<{width}}" + "".join(f"{count or '.':>8}" for count in row))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and latency of the voice-command routers")
+    parser.add_argument("--routers", nargs="+", choices=sorted(ROUTERS), default=list(ROUTERS))
+    parser.add_argument("--categories", nargs="+", help="only score these corpus categories")
+    parser.add_argument("--repeats", type=int, default=3, help="timed passes over the corpus")
+    parser.add_argument("--seed", type=int, default=7, help="seed for the noisy variants")
+    parser.add_argument("--cache", action="store_true", help="keep the embedding cache on (off: every call encodes)")
+    parser.add_argument("--confusion", action="store_true", help="print a confusion matrix per router")
+    parser.add_argument("--errors", action="store_true", help="list misrouted transcripts")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--fail-under", type=float, help="exit 1 if any router's accuracy is below this")
+    args = parser.parse_args()
+
+    items = build_corpus(args.seed)
+    if args.categories:
+        items = [item for item in items if item.category in args.categories]
+
+    if not args.cache:
+        from app.utils.embedding import embedding_service
+        embedding_service.cache_size = 0
+
+    results = {name: evaluate(ROUTERS[name](), items, args.repeats) for name in args.routers}
+    categories = sorted({item.category for item in items})
+
+    print(f"{len(items)} transcripts, {args.repeats} timed passes\n")
+    print(f"{'router':<18}{'acc':>7}{'intent':>8}{'p50 ms':>9}{'p99 ms':>9}{'per s':>9}" + "".join(f"{c[:12]:>14}" for c in categories))
+    for name, result in results.items():
+        intent = f"{result['intent_accuracy']:.1%}" if result["intent_accuracy"] is not None else "-"
+        print(f"{name:<18}{result['accuracy']:>7.1%}{intent:>8}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+              f"{result['throughput']:>9.0f}" + "".join(f"{result['by_category'].get(c, 0):>14.1%}" for c in categories))
+
+    for name, result in results.items():
+        if args.confusion:
+            print(f"\n{name} confusion matrix (rows: expected, columns: predicted)")
+            print(format_confusion(result["confusion"]))
+        if args.errors and result["errors"]:
+            print(f"\n{name} misrouted:")
+            for text, current_feature, expected, got in result["errors"]:
+                print(f"  [{current_feature or '-'}] {text!r}: expected {expected}, got {got}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                name: {
+                    **{key: value for key, value in result.items() if key != "confusion"},
+                    "confusion": [[expected, got, count] for (expected, got), count in result["confusion"].items()],
+                }
+                for name, result in results.items()
+            }, f, indent=2)
+
+    if args.fail_under is not None and any(result["accuracy"] < args.fail_under for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import random
+from typing import NamedTuple, Optional
+
+from ..routing_utterances import UTTERANCES
+
+
+class CorpusItem(NamedTuple):
+    text: str
+    current_feature: str      # feature active in the UI, "" on the home screen
+    command: str              # expected label, a key of FEATURE_LABELS
+    intent: Optional[str]     # expected "navigate" / "query" / "read", None if not scored
+    category: str
+
+
+NAVIGATION = [
+    ("switch to currency", "Currency"),
+    ("go to text", "Text"),
+    ("open distance", "Distance"),
+    ("navigate to face recognition", "Face"),
+    ("i want to use the product scanner", "Product"),
+    ("take me to the news", "News"),
+    ("open the music detector", "Music"),
+    ("let's use the chatbot", "Chatbot"),
+    ("change to object detection", "Object"),
+    ("show me the money reader", "Currency"),
+]
+
+IN_FEATURE_QUERIES = [
+    ("Currency", "how much is this bill worth"),
+    ("Currency", "what's the total amount here"),
+    ("Distance", "how far is the table"),
+    ("Distance", "measure the distance to the door"),
+    ("Product", "what brand is this"),
+    ("Product", "give me the product details"),
+    ("Face", "who is this person"),
+    ("Object", "describe what is this"),
+    ("Chatbot", "what is the capital of france"),
+    ("Chatbot", "tell me a joke"),
+    ("News", "search for news about the election"),
+    ("Music", "what's playing right now"),
+]
+
+READ_COMMANDS = [
+    ("News", "read the article"),
+    ("News", "read me the latest news"),
+    ("Text", "read this text"),
+    ("Text", "read the document aloud"),
+]
+
+PLAY_STOP = [
+    ("Music", "play", "Play"),
+    ("Music", "play it again", "Play"),
+    ("Music", "begin playback", "Play"),
+    ("Music", "stop", "Stop"),
+    ("Music", "pause the music", "Stop"),
+    ("Music", "halt", "Stop"),
+    ("Text", "stop reading", "Stop"),
+    ("News", "cancel that", "Stop"),
+]
+
+# Typical speech-to-text slips: fillers, homophones, dropped articles.
+FILLERS = ["um", "uh", "okay", "hey", "so", "please"]
+HOMOPHONES = {"read": "red", "to": "too", "for": "four", "right": "write", "the": "da", "is": "his", "this": "these"}
+
+
+def clean_corpus() -> list[CorpusItem]:
+    items = [CorpusItem(text, "", command, "navigate", "navigation") for text, command in NAVIGATION]
+    items += [CorpusItem(text, "", command, "navigate", "navigation") for text, command in UTTERANCES]
+    items += [CorpusItem(text, feature, feature, "query", "in_feature_query") for feature, text in IN_FEATURE_QUERIES]
+    items += [CorpusItem(text, feature, feature, "read", "read") for feature, text in READ_COMMANDS]
+    items += [CorpusItem(text, feature, command, None, "play_stop") for feature, text, command in PLAY_STOP]
+    return items
+
+
+def make_noisy(text: str, rng: random.Random) -> str:
+    words = text.split()
+    words = [HOMOPHONES.get(word, word) if rng.random() < 0.5 else word for word in words]
+    if len(words) > 2 and rng.random() < 0.3:
+        words.pop(rng.randrange(len(words)))
+    if rng.random() < 0.7:
+        words.insert(0, rng.choice(FILLERS))
+    if rng.random() < 0.3:
+        words.append(rng.choice(FILLERS))
+    return " ".join(words)
+
+
+def noisy_corpus(items: list[CorpusItem], seed: int = 7) -> list[CorpusItem]:
+    """One perturbed copy of every item; deterministic for a given seed."""
+    rng = random.Random(seed)
+    return [item._replace(text=make_noisy(item.text, rng), category="noisy") for item in items]
+
+
+def build_corpus(seed: int = 7) -> list[CorpusItem]:
+    items = clean_corpus()
+    return items + noisy_corpus(items, seed)
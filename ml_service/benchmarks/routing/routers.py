@@ -0,0 +1,70 @@
+import contextlib
+import io
+from typing import Callable, NamedTuple, Optional
+
+# Feature names that differ between app/main.py (FEATURE_LABELS) and the
+# music-detection app (FEATURES).
+TO_MUSIC_DETECTION = {"News": "Article"}
+FROM_MUSIC_DETECTION = {"Article": "News"}
+# Music-detection actions that are separate labels in FEATURE_LABELS.
+ACTION_LABELS = {"play": "Play", "pause": "Stop"}
+
+
+class Prediction(NamedTuple):
+    command: str
+    intent: Optional[str]  # None when the router has no notion of intent
+
+
+def transcribe_audio_router() -> Callable:
+    """The `/transcribe_audio` handler: exact keyword, then max-score semantic fallback."""
+    from app.utils.audio import FEATURE_LABELS, get_keyword_index, route_transcript
+    from app.utils.embedding import embedding_service
+
+    get_keyword_index(embedding_service, FEATURE_LABELS)
+
+    def route(text, current_feature):
+        result = route_transcript(text, current_feature, embedding_service)
+        return Prediction(result["command"], result["intent"])
+
+    return route
+
+
+def route_query_router() -> Callable:
+    """`route_query_semantically`: mean keyword score per feature, Chatbot below threshold."""
+    from app.utils.audio import FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH, get_keyword_index, route_query_semantically
+    from app.utils.embedding import embedding_service
+
+    get_keyword_index(embedding_service, FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH)
+
+    def route(text, current_feature):
+        # It prints every decision; keep that out of the report.
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = route_query_semantically(text, embedding_service, FEATURE_KEYWORDS_FOR_SEMANTIC_MATCH)
+        return Prediction(result["target_feature"], None)
+
+    return route
+
+
+def detect_command_router() -> Callable:
+    """`detect_command` from the music-detection app, mapped onto FEATURE_LABELS."""
+    from app.music_detection.pipeline import CommandType, detect_command
+
+    def route(text, current_feature):
+        active = TO_MUSIC_DETECTION.get(current_feature, current_feature) or None
+        result = detect_command(text, active)
+        if result.command_type == CommandType.FEATURE:
+            return Prediction(FROM_MUSIC_DETECTION.get(result.command, result.command), "navigate")
+        if result.command in ACTION_LABELS:
+            return Prediction(ACTION_LABELS[result.command], None)
+        # Any other action is a request handled inside the active feature.
+        intent = "read" if result.command == "read" else "query"
+        return Prediction(current_feature or result.command, intent)
+
+    return route
+
+
+ROUTERS = {
+    "transcribe_audio": transcribe_audio_router,
+    "route_query": route_query_router,
+    "detect_command": detect_command_router,
+}
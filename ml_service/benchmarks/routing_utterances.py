@@ -0,0 +1,51 @@
+"""Labeled voice-command transcripts for checking semantic routing decisions.
+
+Labels are keys of `FEATURE_LABELS` in app/utils/audio.py. Most transcripts
+avoid the exact keyword phrases so that they exercise the embedding fallback
+rather than the keyword matcher.
+"""
+
+UTTERANCES = [
+    ("what's in the headlines this morning", "News"),
+    ("give me the latest stories from the paper", "News"),
+    ("summarize this newspaper piece for me", "News"),
+    ("i'd like to have a conversation", "Chatbot"),
+    ("can i ask you something", "Chatbot"),
+    ("let's chat for a bit", "Chatbot"),
+    ("read the words on this sign", "Text"),
+    ("what does this letter say", "Text"),
+    ("read this page out loud", "Text"),
+    ("how much cash am i holding", "Currency"),
+    ("which banknote is this", "Currency"),
+    ("count the coins in my hand", "Currency"),
+    ("what is this thing in front of me", "Object"),
+    ("describe the stuff on the table", "Object"),
+    ("tell me what this object is", "Object"),
+    ("what brand is this bottle", "Product"),
+    ("check the details of this product", "Product"),
+    ("what item am i holding from the store", "Product"),
+    ("how far away is the door", "Distance"),
+    ("measure how close the wall is", "Distance"),
+    ("how many meters to the chair", "Distance"),
+    ("who is standing next to me", "Face"),
+    ("recognize the person in front of me", "Face"),
+    ("is this someone i know", "Face"),
+    ("what song is playing right now", "Music"),
+    ("name this track", "Music"),
+    ("listen to this tune and tell me what it is", "Music"),
+    ("start playing it", "Play"),
+    ("resume playback", "Play"),
+    ("kick it off", "Play"),
+    ("stop that", "Stop"),
+    ("pause it please", "Stop"),
+    ("cancel the current task", "Stop"),
+    ("scan my surroundings", "Detect"),
+    ("what objects are around me", "Detect"),
+    ("spot anything nearby", "Detect"),
+    ("i need some assistance", "Help"),
+    ("what can you do for me", "Help"),
+    ("guide me through the app", "Help"),
+    ("take a photo now", "Capture"),
+    ("snap a picture of this", "Capture"),
+    ("grab an image", "Capture"),
+]
@@ -0,0 +1,71 @@
+"""
+Export the sentence embedder to ONNX and quantize it to int8.
+
+Writes `model.onnx` (dynamically quantized, int8 weights) and `tokenizer.json`
+into the output directory, which is what `EMBEDDING_BACKEND=onnx` loads from
+`EMBEDDING_ONNX_DIR`. Needs torch and transformers, so run it on a build
+machine; the serving nodes only need onnxruntime and tokenizers.
+
+Usage (from ml_service/):
+    python -m scripts.export_minilm_onnx --output models/minilm-onnx-int8
+"""
+import argparse
+import os
+import tempfile
+
+MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def export_fp32(model_id: str, path: str, opset: int):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModel.from_pretrained(model_id).eval()
+    sample = tokenizer(["an example sentence"], return_tensors="pt")
+    inputs = ("input_ids", "attention_mask", "token_type_ids")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in inputs}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in inputs),
+            path,
+            input_names=list(inputs),
+            output_names=["token_embeddings"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    return tokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export all-MiniLM-L6-v2 to an int8 ONNX model")
+    parser.add_argument("--model", default=MODEL_ID)
+    parser.add_argument("--output", default=os.path.join("models", "minilm-onnx-int8"))
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--no-quantize", action="store_true", help="keep float32 weights")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    target = os.path.join(args.output, "model.onnx")
+
+    # Next to the target, so the final os.replace never crosses filesystems (e.g. a tmpfs /tmp).
+    with tempfile.TemporaryDirectory(dir=args.output) as tmp:
+        fp32_path = os.path.join(tmp, "model_fp32.onnx")
+        tokenizer = export_fp32(args.model, fp32_path, args.opset)
+
+        if args.no_quantize:
+            os.replace(fp32_path, target)
+        else:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(fp32_path, target, weight_type=QuantType.QInt8)
+
+    # Only tokenizer.json is used at serving time; the other files are harmless.
+    tokenizer.save_pretrained(args.output)
+    print(f"Wrote {target} ({os.path.getsize(target) / 1024 / 1024:.1f} MiB) and tokenizer files to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
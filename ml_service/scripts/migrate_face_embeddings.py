@@ -0,0 +1,75 @@
+"""
+Rewrite stored face embeddings in the compact binary format.
+
+Converts every document whose `embedding` is still a list of numbers
+(version 1) to the format in `app/face_detection/embedding_codec.py`:
+float32 bytes by default, or float16/int8 with `--format`. Documents are
+updated in place, keeping their `_id`, and stamped with `updated_at`, so
+running face indexes pick the change up through their change stream or,
+on a server without change streams, on their next poll. Safe to re-run:
+converted documents are skipped unless `--reencode` is given.
+
+Usage (from ml_service/, with MONGODB_URI, DB_NAME and DB_COLLECTION set):
+    python -m scripts.migrate_face_embeddings --dry-run
+    python -m scripts.migrate_face_embeddings --format float16
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from app.face_detection.embedding_codec import EMBEDDING_DTYPES, EMBEDDING_FIELDS, decode_embedding, encode_embedding
+from app.face_detection.face_index import utcnow
+
+
+def migrate(collection, fmt: str = "float32", batch_size: int = 500, reencode: bool = False, dry_run: bool = False) -> dict:
+    query = {"embedding": {"$exists": True}} if reencode else {"embedding": {"$type": "array"}}
+    counts = {"matched": 0, "converted": 0, "bytes_before": 0, "bytes_after": 0}
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            collection.bulk_write(batch, ordered=False)
+        counts["converted"] += len(batch)
+        batch.clear()
+
+    for doc in collection.find(query, {"_id": 1, **EMBEDDING_FIELDS}):
+        counts["matched"] += 1
+        vector = decode_embedding(doc)
+        fields = encode_embedding(vector, fmt)
+        update = {"$set": {**fields, "updated_at": utcnow()}}
+        if "embedding_scale" not in fields:
+            update["$unset"] = {"embedding_scale": ""}  # left over from a previous int8 encoding
+        batch.append(UpdateOne({"_id": doc["_id"]}, update))
+
+        stored = doc["embedding"]
+        # A version 1 list is stored as BSON doubles, 8 bytes each.
+        counts["bytes_before"] += len(stored) if isinstance(stored, bytes) else 8 * len(stored)
+        counts["bytes_after"] += len(fields["embedding"])
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert stored face embeddings to compact binary")
+    parser.add_argument("--format", choices=sorted(EMBEDDING_DTYPES), default="float32")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--reencode", action="store_true", help="also rewrite documents already in binary form")
+    parser.add_argument("--dry-run", action="store_true", help="count and size documents without writing")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGODB_URI"))
+    collection = client[os.getenv("DB_NAME")][os.getenv("DB_COLLECTION")]
+
+    counts = migrate(collection, args.format, args.batch_size, args.reencode, args.dry_run)
+    verb = "Would convert" if args.dry_run else "Converted"
+    print(f"{verb} {counts['converted']} of {counts['matched']} documents to {args.format}: "
+          f"embedding payload {counts['bytes_before'] / 2**20:.1f} MiB -> {counts['bytes_after'] / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+#!/bin/bash
+python -m app.prefork --workers "${WEB_CONCURRENCY:-2}" --port "${PORT:-8000}"